@@ -0,0 +1,38 @@
+"""
+命令会话上下文 - 每次命令执行只解析一次消息中的会话信息
+"""
+from dataclasses import dataclass
+
+from src.chat.message_receive.message import MessageRecv
+
+from ..core.utils import build_session_id
+
+
+@dataclass(slots=True)
+class ChatContext:
+    """命令执行时的会话信息"""
+
+    platform: str
+    stream_id: str
+    user_id: str
+    # 群聊为群号，私聊为用户ID（用于管理员模式判断）
+    chat_id: str
+    # stream_id:user_id，场景数据按此隔离
+    session_id: str
+
+
+def resolve_chat_context(message: MessageRecv) -> ChatContext:
+    """从消息中解析会话信息"""
+    stream_id = message.chat_stream.stream_id
+    message_info = message.message_info
+    user_id = str(message_info.user_info.user_id)
+    group_info = message_info.group_info
+    chat_id = (group_info.group_id if group_info else None) or user_id
+
+    return ChatContext(
+        platform=message_info.platform or "",
+        stream_id=stream_id,
+        user_id=user_id,
+        chat_id=chat_id,
+        session_id=build_session_id(stream_id, user_id),
+    )
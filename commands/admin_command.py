@@ -1,7 +1,9 @@
 """
 场景格式插件管理员权限控制命令
 """
-from typing import Tuple, Optional
+import time
+from collections import OrderedDict
+from typing import Any, Dict, FrozenSet, Tuple, Optional
 from src.plugin_system.base.base_command import BaseCommand
 from src.plugin_system.base.component_types import CommandInfo, ComponentType
 from src.chat.message_receive.message import MessageRecv
@@ -13,8 +15,21 @@ logger = get_logger("scene_admin_command")
 class SceneAdminCommand(BaseCommand):
     """场景管理员模式控制命令"""
 
-    # 类级别的管理员模式状态
-    _admin_mode_enabled = {}
+    # 类级别的管理员模式状态（显式设置不参与淘汰，否则会话会静默回落到默认配置）
+    _admin_mode_enabled: Dict[str, bool] = {}
+
+    # 管理员模式判定缓存：chat_key -> (是否启用, 过期时间)，避免每条消息都读取配置
+    _admin_mode_cache: "OrderedDict[str, Tuple[bool, float]]" = OrderedDict()
+    _ADMIN_MODE_CACHE_TTL = 30.0
+
+    # 权限判定结果缓存：(platform, chat_id, user_id) -> (是否有权限, 过期时间)
+    _permission_cache: "OrderedDict[Tuple[str, str, str], Tuple[bool, float]]" = OrderedDict()
+
+    # 上述两个判定缓存的容量上限，防止长期运行时随会话数无限增长
+    _ADMIN_MODE_MAX_ENTRIES = 10000
+
+    # admin_users 配置缓存：(原始配置对象, 字符串ID集合)，配置对象未变化时直接复用
+    _admin_users_cache: Tuple[Any, FrozenSet[str]] = (None, frozenset())
 
     command_name = "scene_admin"
     command_description = "场景管理员模式控制：/sc admin <on|off>"
@@ -33,17 +48,21 @@ class SceneAdminCommand(BaseCommand):
             return False, "无法获取会话信息", 2
 
         message_info = self.message.message_info
-        platform = getattr(message_info, "platform", "")
-        group_info = getattr(message_info, "group_info", None)
-        user_info = getattr(message_info, "user_info", None)
+        try:
+            platform = message_info.platform or ""
+            group_info = message_info.group_info
+            user_info = message_info.user_info
+        except AttributeError:
+            platform, group_info, user_info = "", None, None
 
         if not user_info:
             await self.send_text("❌ 无法获取用户信息")
             return False, "无法获取用户信息", 2
 
         # 确定会话类型
-        if group_info and getattr(group_info, "group_id", None):
-            chat_id = group_info.group_id
+        group_id = group_info.group_id if group_info else None
+        if group_id:
+            chat_id = group_id
             chat_type = "群聊"
         else:
             chat_id = user_info.user_id
@@ -60,6 +79,8 @@ class SceneAdminCommand(BaseCommand):
         # 执行操作
         if action == "on":
             self._admin_mode_enabled[current_chat_key] = True
+            self._admin_mode_cache.pop(current_chat_key, None)
+            self._permission_cache.clear()
             await self.send_text(
                 f"✅ 已在{chat_type}中开启场景管理员模式\n"
                 f"🔒 现在所有场景命令仅管理员可使用\n"
@@ -70,6 +91,8 @@ class SceneAdminCommand(BaseCommand):
 
         elif action == "off":
             self._admin_mode_enabled[current_chat_key] = False
+            self._admin_mode_cache.pop(current_chat_key, None)
+            self._permission_cache.clear()
             await self.send_text(
                 f"✅ 已在{chat_type}中关闭场景管理员模式\n"
                 f"🔓 现在所有人都可使用场景命令"
@@ -82,19 +105,31 @@ class SceneAdminCommand(BaseCommand):
     def _check_admin_permission(self, user_id: str) -> bool:
         """检查当前用户是否是管理员"""
         try:
-            admin_users = self.get_config("admin.admin_users", [])
+            admin_users = self._get_admin_user_set(self.get_config)
             if not admin_users:
                 logger.warning("[SceneAdmin] 未配置管理员列表，允许所有人使用管理命令")
                 return True
 
             # 确保 user_id 转换为字符串进行比较
-            is_admin = str(user_id) in [str(uid) for uid in admin_users]
+            is_admin = str(user_id) in admin_users
             logger.debug(f"[SceneAdmin] 用户 {user_id} 管理员检查结果: {is_admin}")
             return is_admin
         except Exception as e:
             logger.error(f"[SceneAdmin] 检查管理员权限时出错: {e}", exc_info=True)
             return False
 
+    @classmethod
+    def _get_admin_user_set(cls, get_config_func) -> FrozenSet[str]:
+        """获取管理员ID集合（字符串），配置对象未变化时复用缓存"""
+        admin_users = get_config_func("admin.admin_users", [])
+        cached_source, cached_set = cls._admin_users_cache
+        if admin_users is cached_source:
+            return cached_set
+
+        admin_set = frozenset(str(uid) for uid in admin_users or ())
+        cls._admin_users_cache = (admin_users, admin_set)
+        return admin_set
+
     @classmethod
     def is_admin_mode_enabled(cls, platform: str, chat_id: str, get_config_func) -> bool:
         """
@@ -110,12 +145,27 @@ class SceneAdminCommand(BaseCommand):
         """
         current_chat_key = f"{platform}:{chat_id}"
 
-        # 检查运行时覆盖
+        now = time.monotonic()
+        cached = cls._admin_mode_cache.get(current_chat_key)
+        if cached and cached[1] > now:
+            return cached[0]
+
+        # 检查运行时覆盖，否则使用默认配置
         if current_chat_key in cls._admin_mode_enabled:
-            return cls._admin_mode_enabled[current_chat_key]
+            enabled = cls._admin_mode_enabled[current_chat_key]
+        else:
+            enabled = bool(get_config_func("admin.default_admin_mode", False))
+
+        cls._remember(cls._admin_mode_cache, current_chat_key, (enabled, now + cls._ADMIN_MODE_CACHE_TTL))
+        return enabled
 
-        # 检查默认配置
-        return get_config_func("admin.default_admin_mode", False)
+    @classmethod
+    def _remember(cls, store: OrderedDict, key: Any, value: Any):
+        """写入有界字典，超出容量时淘汰最久未使用的条目"""
+        store[key] = value
+        store.move_to_end(key)
+        while len(store) > cls._ADMIN_MODE_MAX_ENTRIES:
+            store.popitem(last=False)
 
     @classmethod
     def check_user_permission(cls, platform: str, chat_id: str, user_id: str, get_config_func) -> bool:
@@ -131,13 +181,25 @@ class SceneAdminCommand(BaseCommand):
         Returns:
             bool: 是否有权限
         """
-        # 如果管理员模式未开启，所有人都有权限
-        if not cls.is_admin_mode_enabled(platform, chat_id, get_config_func):
+        # 常见情况：没有任何会话开启过管理员模式且默认关闭，直接放行
+        if not cls._admin_mode_enabled and not get_config_func("admin.default_admin_mode", False):
             return True
 
-        # 管理员模式已开启，检查是否是管理员
-        admin_users = get_config_func("admin.admin_users", [])
-        return str(user_id) in [str(uid) for uid in admin_users]
+        user_id = str(user_id)
+        cache_key = (platform, str(chat_id), user_id)
+        now = time.monotonic()
+        cached = cls._permission_cache.get(cache_key)
+        if cached and cached[1] > now:
+            return cached[0]
+
+        # 如果管理员模式未开启，所有人都有权限；否则检查是否是管理员
+        allowed = (
+            not cls.is_admin_mode_enabled(platform, chat_id, get_config_func)
+            or user_id in cls._get_admin_user_set(get_config_func)
+        )
+
+        cls._remember(cls._permission_cache, cache_key, (allowed, now + cls._ADMIN_MODE_CACHE_TTL))
+        return allowed
 
     @classmethod
     def get_command_info(cls) -> CommandInfo:
@@ -3,69 +3,23 @@
 """
 import json
 import re
+from functools import cached_property
 from typing import Tuple, Optional, Dict, Any
 from src.plugin_system.base.base_command import BaseCommand
 from src.plugin_system.base.component_types import CommandInfo, ComponentType
-from src.chat.message_receive.message import MessageRecv
 from src.config.config import global_config
 from src.common.logger import get_logger
-from ..core.scene_db import SceneDB
-from ..core.preset_manager import PresetManager
+from ..core.scene_db import SceneDB, get_scene_db
+from ..core.preset_manager import PresetManager, get_preset_manager
 from ..core.llm_client import LLMClientFactory
-from ..core.utils import parse_json_response
+from ..core.utils import parse_json_response, unescape_newlines
+from ._context import resolve_chat_context
+from .admin_command import SceneAdminCommand
 
 logger = get_logger("custom_init_command")
 
-
-class CustomInitCommand(BaseCommand):
-    """自定义场景初始化命令 - 根据用户描述生成初始场景"""
-
-    command_name = "scene_custom_init"
-    command_description = "根据用户描述生成自定义场景"
-    command_pattern = r"^/sc\s+init\s+(?P<description>.+)$"
-
-    def __init__(self, message: MessageRecv, plugin_config: Optional[dict] = None):
-        super().__init__(message, plugin_config)
-        self.db = SceneDB()
-        self.preset_manager = PresetManager(self.db)
-        # 使用 reply 模型生成场景（根据配置选择自定义 API 或 MaiBot 原生）
-        self.llm = LLMClientFactory.create_reply_client(self.get_config)
-
-    async def execute(self) -> Tuple[bool, Optional[str], int]:
-        """执行自定义初始化命令"""
-        stream_id = self.message.chat_stream.stream_id
-        user_id = str(self.message.message_info.user_info.user_id)
-        session_id = self._build_session_id(stream_id, user_id)
-
-        # 权限检查
-        from .admin_command import SceneAdminCommand
-        message_info = self.message.message_info
-        platform = getattr(message_info, "platform", "")
-        group_info = getattr(message_info, "group_info", None)
-        chat_id = group_info.group_id if group_info and getattr(group_info, "group_id", None) else user_id
-
-        if not SceneAdminCommand.check_user_permission(platform, chat_id, user_id, self.get_config):
-            await self.send_text("❌ 当前会话已开启管理员模式，仅管理员可使用")
-            return False, "没有权限", 2
-
-        description = self.matched_groups.get("description", "").strip()
-
-        if not description:
-            reply = "❌ 请提供场景描述"
-            await self.send_text(reply)
-            return False, reply, 2
-
-        logger.info(f"[CustomInit] 自定义初始化场景: {description}")
-
-        # 发送处理中反馈
-        await self.send_text("🎬 正在根据您的描述生成场景...")
-
-        try:
-            # 构建prompt
-            bot_name = global_config.bot.nickname
-            bot_personality = getattr(global_config.personality, "personality", "")
-
-            prompt = f"""【你的身份】
+# 自定义初始化 prompt 模板（静态部分在模块加载时构建一次）
+_PROMPT_TEMPLATE = """【你的身份】
 你是 {bot_name}
 
 【性格特质与身份】
@@ -101,6 +55,62 @@ class CustomInitCommand(BaseCommand):
 
 注意：场景内容中使用 \\n\\n 表示段落换行"""
 
+
+class CustomInitCommand(BaseCommand):
+    """自定义场景初始化命令 - 根据用户描述生成初始场景"""
+
+    command_name = "scene_custom_init"
+    command_description = "根据用户描述生成自定义场景"
+    command_pattern = r"^/sc\s+init\s+(?P<description>.+)$"
+
+    # 依赖按需创建：描述为空等提前返回的路径不会构建 LLM 客户端
+    @cached_property
+    def db(self) -> SceneDB:
+        return get_scene_db()
+
+    @cached_property
+    def preset_manager(self) -> PresetManager:
+        return get_preset_manager()
+
+    @cached_property
+    def llm(self):
+        # 使用 reply 模型生成场景（根据配置选择自定义 API 或 MaiBot 原生）
+        return LLMClientFactory.create_reply_client(self.get_config)
+
+    async def execute(self) -> Tuple[bool, Optional[str], int]:
+        """执行自定义初始化命令"""
+        ctx = resolve_chat_context(self.message)
+        user_id = ctx.user_id
+        session_id = ctx.session_id
+
+        # 权限检查
+        if not SceneAdminCommand.check_user_permission(ctx.platform, ctx.chat_id, user_id, self.get_config):
+            await self.send_text("❌ 当前会话已开启管理员模式，仅管理员可使用")
+            return False, "没有权限", 2
+
+        description = self.matched_groups.get("description", "").strip()
+
+        if not description:
+            reply = "❌ 请提供场景描述"
+            await self.send_text(reply)
+            return False, reply, 2
+
+        logger.info(f"[CustomInit] 自定义初始化场景: {description}")
+
+        # 发送处理中反馈
+        await self.send_text("🎬 正在根据您的描述生成场景...")
+
+        try:
+            # 构建prompt
+            bot_name = global_config.bot.nickname
+            bot_personality = getattr(global_config.personality, "personality", "")
+
+            prompt = _PROMPT_TEMPLATE.format(
+                bot_name=bot_name,
+                bot_personality=bot_personality,
+                description=description
+            )
+
             # 应用完整预设
             enhanced_prompt = self.preset_manager.build_full_preset_prompt(
                 base_prompt=prompt,
@@ -121,28 +131,19 @@ class CustomInitCommand(BaseCommand):
                 await self.send_text(reply)
                 return False, reply, 2
 
-            # 保存到数据库（不启用）
-            nai_enabled = self.db.get_nai_enabled(session_id)
-            self.db.clear_scene_state(session_id)
-            self.db.clear_scene_history(session_id)
-            self.db.clear_character_status(session_id)
-            if nai_enabled:
-                self.db.set_nai_enabled(session_id, True)
-            self.db.create_scene_state(
+            # 写库前统一还原换行符，之后读取时无需再处理
+            scene_text = unescape_newlines(scene_data["场景"])
+
+            # 保存到数据库（不启用），清空旧数据与写入新场景在同一事务内完成
+            self.db.reset_scene_atomic(
                 chat_id=session_id,
                 location=scene_data["地点"],
                 clothing=scene_data["着装"],
-                scene_description=scene_data["场景"],
+                scene_description=scene_text,
                 activity="自定义场景",
-                user_id=user_id
+                user_id=user_id,
+                enabled=False
             )
-            self.db.disable_scene(session_id)
-
-            # 初始化角色状态
-            self.db.init_character_status(session_id)
-
-            # 处理换行符
-            scene_text = scene_data['场景'].replace('\\n\\n', '\n\n').replace('\\n', '\n')
 
             reply = f"""✅ 场景已生成（未启用）
 
@@ -163,11 +164,6 @@ class CustomInitCommand(BaseCommand):
             await self.send_text(reply)
             return False, reply, 2
 
-    def _build_session_id(self, chat_id: str, user_id: Optional[str]) -> str:
-        """构建会话ID"""
-        user_part = user_id or "unknown_user"
-        return f"{chat_id}:{user_part}"
-
     @classmethod
     def get_command_info(cls) -> CommandInfo:
         """返回命令信息"""
@@ -6,37 +6,13 @@ from src.plugin_system.base.base_command import BaseCommand
 from src.plugin_system.base.component_types import CommandInfo, ComponentType
 from src.chat.message_receive.message import MessageRecv
 from src.common.logger import get_logger
+from ._context import resolve_chat_context
+from .admin_command import SceneAdminCommand
 
 logger = get_logger("help_command")
 
-
-class HelpCommand(BaseCommand):
-    """帮助命令 - 显示场景格式插件的所有可用命令"""
-
-    command_name = "scene_help"
-    command_description = "显示场景格式插件的所有可用命令及使用说明"
-    command_pattern = r"^/s(?:cene|c)\s+help.*$"
-
-    def __init__(self, message: MessageRecv, plugin_config: Optional[dict] = None):
-        super().__init__(message, plugin_config)
-
-    async def execute(self) -> Tuple[bool, Optional[str], int]:
-        """执行命令"""
-        logger.info("[HelpCommand] 显示帮助信息")
-
-        # 权限检查
-        from .admin_command import SceneAdminCommand
-        message_info = self.message.message_info
-        user_id = str(message_info.user_info.user_id)
-        platform = getattr(message_info, "platform", "")
-        group_info = getattr(message_info, "group_info", None)
-        chat_id = group_info.group_id if group_info and getattr(group_info, "group_id", None) else user_id
-
-        if not SceneAdminCommand.check_user_permission(platform, chat_id, user_id, self.get_config):
-            await self.send_text("❌ 当前会话已开启管理员模式，仅管理员可使用")
-            return False, "没有权限", 2
-
-        reply = """📖 场景插件帮助 (可用 /sc 或 /scene)
+# 帮助文本为静态内容，模块加载时构建一次
+_HELP_TEXT = """📖 场景插件帮助 (可用 /sc 或 /scene)
 
 【场景控制】
 /sc on           - 启动场景模式（有历史则续接）
@@ -76,6 +52,29 @@ class HelpCommand(BaseCommand):
 
 提示: 启动场景后，@bot 或私聊即可进行场景对话"""
 
+
+class HelpCommand(BaseCommand):
+    """帮助命令 - 显示场景格式插件的所有可用命令"""
+
+    command_name = "scene_help"
+    command_description = "显示场景格式插件的所有可用命令及使用说明"
+    command_pattern = r"^/s(?:cene|c)\s+help.*$"
+
+    def __init__(self, message: MessageRecv, plugin_config: Optional[dict] = None):
+        super().__init__(message, plugin_config)
+
+    async def execute(self) -> Tuple[bool, Optional[str], int]:
+        """执行命令"""
+        logger.info("[HelpCommand] 显示帮助信息")
+
+        # 权限检查
+        ctx = resolve_chat_context(self.message)
+        if not SceneAdminCommand.check_user_permission(ctx.platform, ctx.chat_id, ctx.user_id, self.get_config):
+            await self.send_text("❌ 当前会话已开启管理员模式，仅管理员可使用")
+            return False, "没有权限", 2
+
+        reply = _HELP_TEXT
+
         await self.send_text(reply)
         return True, reply, 2
 
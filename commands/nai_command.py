@@ -7,7 +7,9 @@ from src.plugin_system.base.base_command import BaseCommand
 from src.plugin_system.base.component_types import CommandInfo, ComponentType
 from src.chat.message_receive.message import MessageRecv
 from src.common.logger import get_logger
-from ..core.scene_db import SceneDB
+from ..core.scene_db import get_scene_db
+from ._context import resolve_chat_context
+from .admin_command import SceneAdminCommand
 
 logger = get_logger("nai_command")
 
@@ -17,39 +19,34 @@ class NaiControlCommand(BaseCommand):
 
     command_name = "scene_nai"
     command_description = "控制场景模式下的 NAI 生图开关"
-    command_pattern = r"^/s(?:cene|c)\s+nai\s*.*$"
+    command_pattern = r"^/s(?:cene|c)\s+nai(?:\s+(?P<action>\S+))?.*$"
 
     def __init__(self, message: MessageRecv, plugin_config: Optional[dict] = None):
         super().__init__(message, plugin_config)
-        self.db = SceneDB()
+        self.db = get_scene_db()
 
     async def execute(self) -> Tuple[bool, Optional[str], int]:
         """执行命令"""
-        content = self.message.processed_plain_text.strip().lower()
-        stream_id = self.message.chat_stream.stream_id
-        user_id = str(self.message.message_info.user_info.user_id)
-        session_id = self._build_session_id(stream_id, user_id)
+        content = self.message.processed_plain_text.strip()
+        ctx = resolve_chat_context(self.message)
+        session_id = ctx.session_id
 
         logger.info(f"[NaiCommand] 执行命令: {content}, session_id={session_id}")
 
         # 权限检查
-        from .admin_command import SceneAdminCommand
-        message_info = self.message.message_info
-        platform = getattr(message_info, "platform", "")
-        group_info = getattr(message_info, "group_info", None)
-        chat_id = group_info.group_id if group_info and getattr(group_info, "group_id", None) else user_id
-
-        if not SceneAdminCommand.check_user_permission(platform, chat_id, user_id, self.get_config):
+        if not SceneAdminCommand.check_user_permission(ctx.platform, ctx.chat_id, ctx.user_id, self.get_config):
             await self.send_text("❌ 当前会话已开启管理员模式，仅管理员可使用")
             return False, "没有权限", 2
 
-        # 解析子命令
-        if "on" in content:
-            return await self._handle_nai_on(session_id)
-        elif "off" in content:
-            return await self._handle_nai_off(session_id)
-        else:
-            return await self._handle_nai_status(session_id)
+        # 解析子命令（由正则直接捕获，未知或缺省时显示状态）
+        action_raw = self.matched_groups.get("action") if self.matched_groups else None
+        action = action_raw.lower() if action_raw else ""
+        handlers = {
+            "on": self._handle_nai_on,
+            "off": self._handle_nai_off,
+        }
+        handler = handlers.get(action, self._handle_nai_status)
+        return await handler(session_id)
 
     async def _handle_nai_on(self, session_id: str) -> Tuple[bool, Optional[str], int]:
         """开启 NAI 生图"""
@@ -86,11 +83,6 @@ class NaiControlCommand(BaseCommand):
         await self.send_text(reply)
         return True, reply, 2
 
-    def _build_session_id(self, chat_id: str, user_id: Optional[str]) -> str:
-        """构建会话ID"""
-        user_part = user_id or "unknown_user"
-        return f"{chat_id}:{user_part}"
-
     @classmethod
     def get_command_info(cls) -> CommandInfo:
         """返回命令信息"""
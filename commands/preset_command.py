@@ -1,16 +1,50 @@
 """
 文风管理命令 - /sc style
 """
+import re
 from typing import Tuple, Optional
 from src.plugin_system.base.base_command import BaseCommand
 from src.plugin_system.base.component_types import CommandInfo, ComponentType
 from src.chat.message_receive.message import MessageRecv
 from src.common.logger import get_logger
-from ..core.preset_manager import PresetManager
-from ..core.scene_db import SceneDB
+from ..core.preset_manager import get_preset_manager
+from ._context import resolve_chat_context
+from .admin_command import SceneAdminCommand
 
 logger = get_logger("style_command")
 
+# 帮助文本模板（静态部分在模块加载时构建一次）
+_HELP_TEMPLATE = """📖 文风与视角管理
+
+{status}
+当前视角: {current_pov}
+
+【文风命令】
+• /sc style list    - 列出所有文风
+• /sc style use <n> - 选择文风（序号或名称）
+• /sc style clear   - 清除文风
+• /sc style status  - 查看当前文风
+
+【视角命令】
+• /sc pov      - 查看当前视角
+• /sc pov 1    - 切换为第一人称
+• /sc pov 3    - 切换为第三人称
+
+示例:
+  /sc style use 鲁迅
+  /sc pov 1"""
+
+_POV_HELP_TEMPLATE = "📷 当前视角: {current_pov}\n\n切换命令:\n• /sc pov 1  - 第一人称\n• /sc pov 3  - 第三人称"
+
+# 单条消息的最大长度，超出时分页发送，避免触发平台消息长度限制
+_MAX_REPLY_CHARS = 1500
+
+# 表示“本次命令尚未读取”的哨兵值（当前文风本身可能为 None）
+_UNSET = object()
+
+# 命令解析正则：group(1) 为命令类型（文风/视角），group(2) 为其后的参数
+_CMD_RE = re.compile(r"^/s(?:cene|c)\s+(style|文风|preset|pov|视角)(?:\s+(.*))?$", re.DOTALL)
+
 
 class PresetCommand(BaseCommand):
     """文风管理命令 - /sc style"""
@@ -21,8 +55,11 @@ class PresetCommand(BaseCommand):
 
     def __init__(self, message: MessageRecv, plugin_config: Optional[dict] = None):
         super().__init__(message, plugin_config)
-        self.db = SceneDB()
-        self.preset_manager = PresetManager(self.db)
+        self.preset_manager = get_preset_manager()
+        self.db = self.preset_manager.db
+        # 单次命令内的读取缓存，写操作后失效
+        self._current_style = _UNSET
+        self._perspective = _UNSET
 
     async def execute(self) -> Tuple[bool, Optional[str], int]:
         """执行命令"""
@@ -31,42 +68,38 @@ class PresetCommand(BaseCommand):
         logger.info(f"[StyleCommand] 执行命令: {content}")
 
         # 权限检查
-        from .admin_command import SceneAdminCommand
-        message_info = self.message.message_info
-        user_id = str(message_info.user_info.user_id)
-        platform = getattr(message_info, "platform", "")
-        group_info = getattr(message_info, "group_info", None)
-        chat_id = group_info.group_id if group_info and getattr(group_info, "group_id", None) else user_id
-
-        if not SceneAdminCommand.check_user_permission(platform, chat_id, user_id, self.get_config):
+        ctx = resolve_chat_context(self.message)
+        if not SceneAdminCommand.check_user_permission(ctx.platform, ctx.chat_id, ctx.user_id, self.get_config):
             await self.send_text("❌ 当前会话已开启管理员模式，仅管理员可使用")
             return False, "没有权限", 2
 
-        # 解析命令类型
-        parts = content.split()
-        # parts[0] = "/sc", parts[1] = "style"/"pov", parts[2] = 子命令
-        command_type = parts[1].lower() if len(parts) > 1 else ""
+        # 解析命令类型，只匹配一次
+        match = _CMD_RE.match(content)
+        command_type = match.group(1) if match else ""
+        args = (match.group(2) or "").split() if match else []
 
         # 视角命令
         if command_type in ("pov", "视角"):
-            return await self._handle_pov(parts[2:] if len(parts) > 2 else [])
-
-        # 文风命令
-        subcommand = parts[2].lower() if len(parts) > 2 else ""
-
-        if subcommand in ("list", "ls", "列表"):
-            return await self._handle_list()
-        elif subcommand in ("use", "set", "选择"):
-            return await self._handle_use(parts[3:] if len(parts) > 3 else [])
-        elif subcommand in ("clear", "off", "关闭"):
-            return await self._handle_clear()
-        elif subcommand in ("status", "当前"):
-            return await self._handle_status()
-        else:
-            # 默认显示当前状态和帮助
-            return await self._handle_help()
-
-    async def _handle_list(self) -> Tuple[bool, Optional[str], int]:
+            return await self._handle_pov(args)
+
+        # 文风命令：查表分发，未知子命令默认显示当前状态和帮助
+        subcommand = args[0].lower() if args else ""
+        handler = self._STYLE_HANDLERS.get(subcommand, PresetCommand._handle_help)
+        return await handler(self, args[1:])
+
+    def _get_current_style(self) -> Optional[dict]:
+        """读取当前文风（单次命令内只查询一次数据库）"""
+        if self._current_style is _UNSET:
+            self._current_style = self.preset_manager.get_current_style()
+        return self._current_style
+
+    def _get_perspective(self) -> str:
+        """读取当前视角（单次命令内只查询一次数据库）"""
+        if self._perspective is _UNSET:
+            self._perspective = self.db.get_perspective()
+        return self._perspective
+
+    async def _handle_list(self, args: list) -> Tuple[bool, Optional[str], int]:
         """列出所有文风"""
         styles = self.preset_manager.get_styles()
 
@@ -75,20 +108,39 @@ class PresetCommand(BaseCommand):
             await self.send_text(reply)
             return False, reply, 2
 
-        current = self.preset_manager.get_current_style()
+        current = self._get_current_style()
         current_id = current["id"] if current else None
 
-        reply = f"📚 可用文风 ({len(styles)}个)\n\n"
-
+        lines = [f"📚 可用文风 ({len(styles)}个)", ""]
         for i, style in enumerate(styles, 1):
             is_active = "✅ " if style["id"] == current_id else ""
-            reply += f"{i}. {is_active}{style['name']}\n"
+            lines.append(f"{i}. {is_active}{style['name']}")
+        lines.append("")
+        lines.append("使用 /sc style use <序号或名称> 选择文风")
 
-        reply += f"\n使用 /sc style use <序号或名称> 选择文风"
+        reply = "\n".join(lines)
 
-        await self.send_text(reply)
+        for page in self._paginate(lines):
+            await self.send_text(page)
         return True, reply, 2
 
+    @staticmethod
+    def _paginate(lines: list) -> list:
+        """按 _MAX_REPLY_CHARS 将多行文本切分为若干页（单行不拆分）"""
+        pages = []
+        current = []
+        size = 0
+        for line in lines:
+            if current and size + len(line) > _MAX_REPLY_CHARS:
+                pages.append("\n".join(current))
+                current = []
+                size = 0
+            current.append(line)
+            size += len(line) + 1
+        if current:
+            pages.append("\n".join(current))
+        return pages
+
     async def _handle_use(self, args: list) -> Tuple[bool, Optional[str], int]:
         """选择文风"""
         if not args:
@@ -96,25 +148,25 @@ class PresetCommand(BaseCommand):
             await self.send_text(reply)
             return False, reply, 2
 
-        query = " ".join(args)
-        styles = self.preset_manager.get_styles()
+        query = args[0] if len(args) == 1 else " ".join(args)
 
-        # 尝试按序号查找
-        try:
+        # 尝试按序号查找（先判断是否为数字，避免名称查询时抛出异常）
+        if query.isdecimal():
+            styles = self.preset_manager.get_styles()
             index = int(query) - 1
             if 0 <= index < len(styles):
                 style = styles[index]
                 self.preset_manager.activate_style(style["id"])
+                self._current_style = _UNSET
                 reply = f"✅ 已选择文风: {style['name']}"
                 await self.send_text(reply)
                 return True, reply, 2
-        except ValueError:
-            pass
 
         # 按名称查找
         style = self.preset_manager.get_style_by_name(query)
         if style:
             self.preset_manager.activate_style(style["id"])
+            self._current_style = _UNSET
             reply = f"✅ 已选择文风: {style['name']}"
             await self.send_text(reply)
             return True, reply, 2
@@ -123,16 +175,17 @@ class PresetCommand(BaseCommand):
         await self.send_text(reply)
         return False, reply, 2
 
-    async def _handle_clear(self) -> Tuple[bool, Optional[str], int]:
+    async def _handle_clear(self, args: list) -> Tuple[bool, Optional[str], int]:
         """清除文风"""
         self.preset_manager.deactivate_style()
+        self._current_style = _UNSET
         reply = "✅ 已清除文风，将使用默认风格"
         await self.send_text(reply)
         return True, reply, 2
 
-    async def _handle_status(self) -> Tuple[bool, Optional[str], int]:
+    async def _handle_status(self, args: list) -> Tuple[bool, Optional[str], int]:
         """查看当前文风"""
-        current = self.preset_manager.get_current_style()
+        current = self._get_current_style()
 
         if not current:
             reply = "当前未选择文风\n使用 /sc style list 查看可用文风"
@@ -145,60 +198,53 @@ class PresetCommand(BaseCommand):
 
     async def _handle_pov(self, args: list) -> Tuple[bool, Optional[str], int]:
         """处理视角切换命令"""
-        current_pov = self.db.get_perspective()
+        current_pov = self._get_perspective()
 
         if not args:
             # 显示当前视角
-            reply = f"📷 当前视角: {current_pov}\n\n切换命令:\n• /sc pov 1  - 第一人称\n• /sc pov 3  - 第三人称"
+            reply = _POV_HELP_TEMPLATE.format(current_pov=current_pov)
             await self.send_text(reply)
             return True, reply, 2
 
         arg = args[0].lower()
+        perspective = self._POV_OPTIONS.get(arg)
 
-        if arg in ("1", "first", "第一人称", "第一"):
-            self.db.set_perspective("第一人称")
-            reply = "✅ 已切换为第一人称视角"
-            await self.send_text(reply)
-            return True, reply, 2
-        elif arg in ("3", "third", "第三人称", "第三"):
-            self.db.set_perspective("第三人称")
-            reply = "✅ 已切换为第三人称视角"
-            await self.send_text(reply)
-            return True, reply, 2
-        else:
+        if perspective is None:
             reply = f"❌ 无效的视角: {arg}\n\n可用选项:\n• 1 / first / 第一人称\n• 3 / third / 第三人称"
             await self.send_text(reply)
             return False, reply, 2
 
-    async def _handle_help(self) -> Tuple[bool, Optional[str], int]:
+        self.db.set_perspective(perspective)
+        self._perspective = _UNSET
+        reply = f"✅ 已切换为{perspective}视角"
+        await self.send_text(reply)
+        return True, reply, 2
+
+    async def _handle_help(self, args: list) -> Tuple[bool, Optional[str], int]:
         """显示帮助"""
-        current = self.preset_manager.get_current_style()
-        current_pov = self.db.get_perspective()
+        current = self._get_current_style()
+        current_pov = self._get_perspective()
         status = f"当前文风: {current['name']}" if current else "当前未选择文风"
 
-        reply = f"""📖 文风与视角管理
-
-{status}
-当前视角: {current_pov}
-
-【文风命令】
-• /sc style list    - 列出所有文风
-• /sc style use <n> - 选择文风（序号或名称）
-• /sc style clear   - 清除文风
-• /sc style status  - 查看当前文风
-
-【视角命令】
-• /sc pov      - 查看当前视角
-• /sc pov 1    - 切换为第一人称
-• /sc pov 3    - 切换为第三人称
-
-示例:
-  /sc style use 鲁迅
-  /sc pov 1"""
+        reply = _HELP_TEMPLATE.format(status=status, current_pov=current_pov)
 
         await self.send_text(reply)
         return True, reply, 2
 
+    # 文风子命令 -> 处理函数（类加载时构建一次）
+    _STYLE_HANDLERS = {
+        "list": _handle_list, "ls": _handle_list, "列表": _handle_list,
+        "use": _handle_use, "set": _handle_use, "选择": _handle_use,
+        "clear": _handle_clear, "off": _handle_clear, "关闭": _handle_clear,
+        "status": _handle_status, "当前": _handle_status,
+    }
+
+    # 视角参数 -> 视角名称
+    _POV_OPTIONS = {
+        "1": "第一人称", "first": "第一人称", "第一人称": "第一人称", "第一": "第一人称",
+        "3": "第三人称", "third": "第三人称", "第三人称": "第三人称", "第三": "第三人称",
+    }
+
     @classmethod
     def get_command_info(cls) -> CommandInfo:
         """返回命令信息"""
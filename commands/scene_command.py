@@ -1,8 +1,11 @@
 """
 场景模式命令
 """
-import json
+import asyncio
+import bisect
 import re
+import time
+import weakref
 from datetime import datetime
 from typing import Tuple, Optional, Dict, Any
 from src.plugin_system.base.base_command import BaseCommand
@@ -10,13 +13,183 @@ from src.plugin_system.base.component_types import CommandInfo, ComponentType
 from src.chat.message_receive.message import MessageRecv
 from src.config.config import global_config
 from src.common.logger import get_logger
-from ..core.scene_db import SceneDB
-from ..core.preset_manager import PresetManager
+from ..core.scene_db import get_scene_db
+from ..core.preset_manager import get_preset_manager
 from ..core.llm_client import LLMClientFactory
-from ..core.utils import parse_json_response
+from ..core.utils import build_session_id, parse_datetime, parse_json_response, unescape_newlines
+from ._context import resolve_chat_context
+from .admin_command import SceneAdminCommand
 
 logger = get_logger("scene_command")
 
+# 由其他命令处理的 /sc 子命令（SceneCommand 的正则需排除这些前缀）
+_SIBLING_SUBCOMMANDS = (
+    "preset", "help", "admin", "status", "nai", "nsfw",
+    "style", "文风", "pov", "视角", "schedule", "日程",
+)
+
+# 场景初始化 prompt 模板（静态部分在模块加载时构建一次）
+_INIT_PROMPT_TEMPLATE = """【你的身份】
+你是 {bot_name}
+
+【性格特质与身份】
+{bot_personality}
+
+【回复风格】
+{bot_reply_style}
+
+【当前时间和活动】
+现在是 {time_hm}（{time_period}）
+根据日程，你现在应该在：{activity}
+活动描述：{description}
+
+【建议状态】
+建议地点：{location}
+建议着装：{clothing}
+
+【初始化任务】
+请生成你此时此刻的状态，用小说化的方式呈现。
+
+1. 地点：基于建议地点，可微调（3-8字，简洁）
+2. 着装：基于建议着装，可微调（10-20字，简短描述）
+3. 场景：用第一人称（"我"）创作一段小说化的场景描写（150-300字）
+
+【场景描写要求】
+必须包含以下元素，像写小说一样：
+
+✦ 环境描写：描绘周围的场景、氛围、光线、声音等细节
+✦ 动作描写：细腻刻画你当前的动作、表情、姿态
+✦ 心理描写：适当融入内心想法、感受（可选）
+✦ 合理分段：使用换行符分段，让叙述节奏自然流畅
+
+【写作风格】
+- 使用生动的细节描写，避免空洞抽象
+- 句式富有变化，长短结合
+- 营造画面感和沉浸感
+- 避免陈词滥调，力求新鲜自然
+
+【分段建议】
+- 第一段：环境/氛围描写
+- 第二段：我的动作和状态描写
+- （可选第三段）：心理活动或补充描写
+
+【输出格式】
+严格按照JSON格式输出：
+
+```json
+{{
+  "地点": "...",
+  "着装": "...",
+  "场景": "第一段场景描写\\n\\n第二段场景描写\\n\\n第三段场景描写（如有）"
+}}
+```
+
+注意：场景内容中使用 \\n\\n 表示段落换行（两个换行符）"""
+
+# 场景续接 prompt 模板
+_RESUME_PROMPT_TEMPLATE = """【你的身份】
+你是 {bot_name}
+
+【性格特质与身份】
+{bot_personality}
+
+【回复风格】
+{bot_reply_style}
+
+【上次场景状态】（{last_update_time}）
+地点：{last_location}
+着装：{last_clothing}
+场景：{last_scene}
+当时活动：{last_activity}
+
+【当前时间和活动】（{now}）
+现在应该在：{activity}
+活动描述：{description}
+建议地点：{location}
+建议着装：{clothing}
+
+【时间跨度】
+距离上次对话已经过去了 {time_diff_hours:.1f} 小时
+
+【任务】
+请生成一个"续接性"的场景，包含过渡说明和当前状态。
+
+1. 过渡说明：简短回顾中间发生的事（{transition_length}）
+   - 概括时间流逝过程中的主要活动
+   - 自然过渡到当前状态
+
+2. 当前场景：用第一人称（"我"）创作小说化的场景描写（150-300字）
+   - 地点：基于当前活动判断（可能变化，也可能不变）
+   - 着装：基于当前活动判断（可能变化，也可能不变）
+   - 场景：包含环境描写、动作描写、心理描写
+
+【场景描写要求】
+必须包含以下元素，像写小说一样：
+
+✦ 环境描写：描绘周围的场景、氛围、光线、声音等细节
+✦ 动作描写：细腻刻画你当前的动作、表情、姿态
+✦ 心理描写：适当融入内心想法、感受（可选）
+✦ 合理分段：使用换行符分段，让叙述节奏自然流畅
+
+【写作风格】
+- 使用生动的细节描写，避免空洞抽象
+- 句式富有变化，长短结合
+- 营造画面感和沉浸感
+- 避免陈词滥调，力求新鲜自然
+
+【分段建议】
+- 第一段：环境/氛围描写
+- 第二段：我的动作和状态描写
+- （可选第三段）：心理活动或补充描写
+
+【输出格式】
+```json
+{{
+  "过渡说明": "简短概括中间发生的事...",
+  "地点": "...",
+  "着装": "...",
+  "场景": "第一段场景描写\\n\\n第二段场景描写\\n\\n第三段场景描写（如有）"
+}}
+```
+
+注意：场景内容中使用 \\n\\n 表示段落换行（两个换行符）"""
+
+# 小时 -> 时间段描述（0-23 点查表）
+_HOUR_TO_PERIOD = (
+    ("深夜",) * 5 + ("清晨",) * 3 + ("上午",) * 4 + ("中午",) * 2
+    + ("下午",) * 4 + ("傍晚",) * 2 + ("晚上",) * 4
+)
+
+# 时间差（小时）分界点及对应的过渡说明长度
+_TRANSITION_BOUNDS = (1.0, 4.0, 12.0)
+_TRANSITION_LENGTHS = ("1句话", "1-2句话", "2-3句话", "3-5句话，可能跨天")
+
+# 会话ID -> 锁，同一会话的 on/off/init 串行执行，避免并发重复调用 LLM
+# 使用弱引用字典，锁不再被持有时自动回收
+_SESSION_LOCKS: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+
+def _scene_card(location: Any, clothing: Any, scene_text: Any) -> str:
+    """地点/着装/场景三段式展示文本，各类回复共用"""
+    return f"📍 地点：{location}\n👗 着装：{clothing}\n\n🎬 场景：\n{scene_text}"
+
+
+def _lock_for(session_id: str) -> asyncio.Lock:
+    """获取（或创建）会话对应的锁"""
+    lock = _SESSION_LOCKS.get(session_id)
+    if lock is None:
+        lock = asyncio.Lock()
+        _SESSION_LOCKS[session_id] = lock
+    return lock
+
+
+# 子命令 -> 处理方法名
+_SUBCOMMAND_HANDLERS = {
+    "on": "_handle_scene_on",
+    "off": "_handle_scene_off",
+    "init": "_handle_scene_init",
+}
+
 
 class SceneCommand(BaseCommand):
     """场景模式命令 - /scene on/off/init"""
@@ -25,53 +198,53 @@ class SceneCommand(BaseCommand):
     command_description = "场景模式控制命令，支持on/off/init"
     # 支持 /sc 和 /scene，避免和其他子命令冲突
     command_pattern = (
-        r"^/s(?:cene|c)"
-        r"(?:\s+(?!preset\b|help\b|admin\b|status\b|nai\b|nsfw\b|style\b|文风\b|pov\b|视角\b|schedule\b|日程\b|init\s+.+).*)?$"
+        r"^/s(?:cene|c)(?:\s+(?!"
+        + "|".join(rf"{re.escape(sub)}\b" for sub in _SIBLING_SUBCOMMANDS)
+        + r"|init\s+.+).*)?$"
     )
 
+    # 机器人身份缓存：(bot 配置对象, personality 配置对象, (昵称, 人设, 回复风格))，配置对象未变化时直接复用
+    _identity_cache: Tuple[Any, Any, Tuple[str, str, str]] = (None, None, ("", "", ""))
+
     def __init__(self, message: MessageRecv, plugin_config: Optional[dict] = None):
         super().__init__(message, plugin_config)
-        self.db = SceneDB()
-        self.preset_manager = PresetManager(self.db)
+        self.db = get_scene_db()
+        self.preset_manager = get_preset_manager()
+        # 尚未确认送达的“处理中”提示，发送正式回复前需先等待其完成
+        self._progress_task: Optional[asyncio.Task] = None
         # 使用 reply 模型生成场景（根据配置选择自定义 API 或 MaiBot 原生）
         self.llm = LLMClientFactory.create_reply_client(self.get_config)
 
     async def execute(self) -> Tuple[bool, Optional[str], int]:
         """执行命令"""
-        stream_id = self.message.chat_stream.stream_id
-        user_id = str(self.message.message_info.user_info.user_id)
-        session_id = self._build_session_id(stream_id, user_id)
+        ctx = resolve_chat_context(self.message)
+        stream_id = ctx.stream_id
+        user_id = ctx.user_id
+        session_id = ctx.session_id
         content = self.message.processed_plain_text.strip()
 
         logger.info(f"[SceneCommand] 执行命令: {content}, chat_id={stream_id}, user_id={user_id}")
 
-        # 权限检查
-        from .admin_command import SceneAdminCommand
-        message_info = self.message.message_info
-        platform = getattr(message_info, "platform", "")
-        group_info = getattr(message_info, "group_info", None)
-        chat_id = group_info.group_id if group_info and getattr(group_info, "group_id", None) else user_id
-
-        if not SceneAdminCommand.check_user_permission(platform, chat_id, user_id, self.get_config):
+        # 权限检查（结果由 SceneAdminCommand 按 (平台, 会话, 用户) 做 TTL 缓存）
+        if not SceneAdminCommand.check_user_permission(ctx.platform, ctx.chat_id, user_id, self.get_config):
             await self.send_text("❌ 当前会话已开启管理员模式，仅管理员可使用")
             return False, "没有权限", 2
 
-        # 解析子命令 - 使用更严格的匹配
-        parts = content.split()
+        # 解析子命令（只需切出前两个词）
+        parts = content.split(maxsplit=2)
         # 获取子命令（如果有的话）
         subcommand = parts[1].lower() if len(parts) > 1 else ""
 
-        if subcommand == "on":
-            result = await self._handle_scene_on(stream_id, session_id, user_id)
-            logger.info(f"[SceneCommand] scene on 返回: success={result[0]}, reply_len={len(result[1]) if result[1] else 0}")
-            return result
-        elif subcommand == "off":
-            result = await self._handle_scene_off(stream_id, session_id, user_id)
-            logger.info(f"[SceneCommand] scene off 返回: {result}")
-            return result
-        elif subcommand == "init":
-            result = await self._handle_scene_init(stream_id, session_id, user_id)
-            logger.info(f"[SceneCommand] scene init 返回: success={result[0]}, reply_len={len(result[1]) if result[1] else 0}")
+        handler_name = _SUBCOMMAND_HANDLERS.get(subcommand)
+        if handler_name:
+            async with _lock_for(session_id):
+                # 在锁内只查询一次已有状态，交给各子命令处理
+                resolved_id, state = self._get_existing_state(stream_id, user_id, session_id)
+                try:
+                    result = await getattr(self, handler_name)(resolved_id, state, session_id, user_id)
+                finally:
+                    await self._flush_progress()
+            logger.info(f"[SceneCommand] scene {subcommand} 返回: success={result[0]}, reply_len={len(result[1]) if result[1] else 0}")
             return result
         elif subcommand == "":
             # /sc 不带参数，提示使用帮助
@@ -84,57 +257,47 @@ class SceneCommand(BaseCommand):
             await self.send_text(reply)
             return False, reply, 2
 
-    def _build_session_id(self, chat_id: str, user_id: Optional[str]) -> str:
-        """构建会话ID，使每位用户的状态互相隔离"""
-        user_part = user_id or "unknown_user"
-        return f"{chat_id}:{user_part}"
-
     def _reset_session_storage(self, resolved_id: Optional[str], session_id: str):
         """清空旧的场景存档，同时保留 NAI 开关"""
-        target_ids = {cid for cid in (resolved_id, session_id) if cid}
-        preserve_nai = False
-        for cid in target_ids:
-            if self.db.get_nai_enabled(cid):
-                preserve_nai = True
-                break
-
-        for cid in target_ids:
-            self.db.clear_scene_state(cid)
-            self.db.clear_scene_history(cid)
-            self.db.clear_character_status(cid)
-
-        if preserve_nai:
-            self.db.set_nai_enabled(session_id, True)
+        if not resolved_id or resolved_id == session_id:
+            target_ids = [session_id]
+        else:
+            target_ids = [resolved_id, session_id]
+        # 查询 NAI 开关、清空三张表与恢复开关在同一事务内完成
+        self.db.clear_sessions_atomic(target_ids, session_id)
 
     def _get_existing_state(self, chat_id: str, user_id: str, session_id: Optional[str] = None) -> Tuple[str, Optional[dict]]:
         """查找当前用户已存在的场景状态（兼容旧版本）"""
-        target_id = session_id or self._build_session_id(chat_id, user_id)
-        state = self.db.get_scene_state(target_id)
+        target_id = session_id or build_session_id(chat_id, user_id)
+        # 当前会话 > 该用户的历史会话 > 旧的 chat_id 状态（仅当无法识别用户时），一次查询完成
+        state = self.db.find_best_state(target_id, chat_id, user_id, include_legacy=not user_id)
         if state:
-            return target_id, state
-
-        # 尝试通过 user_id 查找历史会话
-        user_state = self.db.get_state_by_user(chat_id, user_id)
-        if user_state:
-            return user_state["chat_id"], user_state
-
-        # 仅当无法识别用户时才使用旧的 chat_id 状态
-        if not user_id:
-            legacy_state = self.db.get_scene_state(chat_id)
-            if legacy_state:
-                return chat_id, legacy_state
+            return state["chat_id"], state
 
         return target_id, None
 
     async def _send_command_reply(self, text: str, success: bool = True, intercept_level: int = 2) -> Tuple[bool, str, int]:
         """统一发送命令回复"""
+        await self._flush_progress()
         await self.send_text(text)
         return success, text, intercept_level
 
-    async def _handle_scene_on(self, chat_id: str, session_id: str, user_id: str) -> Tuple[bool, str, int]:
-        """启动场景模式"""
-        resolved_id, state = self._get_existing_state(chat_id, user_id, session_id)
+    def _start_progress(self, text: str):
+        """后台发送“处理中”提示，不阻塞后续的 prompt 构建和 LLM 请求"""
+        self._progress_task = asyncio.create_task(self.send_text(text))
+
+    async def _flush_progress(self):
+        """等待“处理中”提示发送完成，保证其排在正式回复之前"""
+        task, self._progress_task = self._progress_task, None
+        if task is None:
+            return
+        try:
+            await task
+        except Exception as e:
+            logger.warning(f"[SceneCommand] 发送处理中提示失败: {e}")
 
+    async def _handle_scene_on(self, resolved_id: str, state: Optional[dict], session_id: str, user_id: str) -> Tuple[bool, str, int]:
+        """启动场景模式"""
         if state and state.get("enabled") == 1:
             return await self._send_command_reply("⚠️ 场景模式已经启用")
 
@@ -145,22 +308,18 @@ class SceneCommand(BaseCommand):
             # 无历史，初始化模式
             return await self._initialize_scene(session_id, user_id)
 
-    async def _handle_scene_off(self, chat_id: str, session_id: str, user_id: str) -> Tuple[bool, str, int]:
+    async def _handle_scene_off(self, resolved_id: str, state: Optional[dict], session_id: str, user_id: str) -> Tuple[bool, str, int]:
         """关闭场景模式"""
-        resolved_id, state = self._get_existing_state(chat_id, user_id, session_id)
-
         if not state or state.get("enabled") != 1:
             return await self._send_command_reply("⚠️ 场景模式未启用")
 
         self.db.disable_scene(resolved_id)
         return await self._send_command_reply("❌ 场景模式已关闭（状态已保留，下次 /scene on 可续接）")
 
-    async def _handle_scene_init(self, chat_id: str, session_id: str, user_id: str) -> Tuple[bool, str, int]:
+    async def _handle_scene_init(self, resolved_id: str, state: Optional[dict], session_id: str, user_id: str) -> Tuple[bool, str, int]:
         """重新初始化场景（不启用）"""
-        resolved_id, _ = self._get_existing_state(chat_id, user_id, session_id)
-
         # 发送处理中反馈
-        await self.send_text("🎬 正在初始化场景...")
+        self._start_progress("🎬 正在初始化场景...")
 
         # 清空旧存档并保留必要标识
         self._reset_session_storage(resolved_id, session_id)
@@ -168,25 +327,19 @@ class SceneCommand(BaseCommand):
         # 重新初始化（但不启用）
         return await self._initialize_scene_without_enable(session_id, user_id)
 
-    async def _handle_scene_status(self, chat_id: str, session_id: str, user_id: str) -> Tuple[bool, str, int]:
+    async def _handle_scene_status(self, resolved_id: str, state: Optional[dict], session_id: str, user_id: str) -> Tuple[bool, str, int]:
         """查看场景状态"""
-        resolved_id, state = self._get_existing_state(chat_id, user_id, session_id)
-
         if not state or not state.get("location"):
             return await self._send_command_reply("场景模式未启用，使用 /scene on 启动")
 
         enabled_text = "启用" if state.get("enabled") == 1 else "禁用"
 
         # 处理场景中的换行符
-        scene_text = state['scene_description'].replace('\\n\\n', '\n\n').replace('\\n', '\n')
+        scene_text = unescape_newlines(state['scene_description'])
 
         reply = f"""📍 当前场景状态：{enabled_text}
 
-📍 地点：{state['location']}
-👗 着装：{state['clothing']}
-
-🎬 场景：
-{scene_text}
+{_scene_card(state['location'], state['clothing'], scene_text)}
 
 最后活动：{state['last_activity']}
 更新时间：{state['last_update_time']}
@@ -194,68 +347,38 @@ class SceneCommand(BaseCommand):
 
         return await self._send_command_reply(reply)
 
+    @classmethod
+    def _get_identity(cls) -> Tuple[str, str, str]:
+        """获取 (昵称, 人设, 回复风格)，配置重载前复用缓存"""
+        bot_config = global_config.bot
+        personality_config = global_config.personality
+        cached_bot, cached_personality, identity = cls._identity_cache
+        if bot_config is cached_bot and personality_config is cached_personality:
+            return identity
+
+        identity = (
+            bot_config.nickname,
+            getattr(personality_config, "personality", ""),
+            getattr(personality_config, "reply_style", ""),
+        )
+        cls._identity_cache = (bot_config, personality_config, identity)
+        return identity
+
     def _build_init_prompt(self, activity: Dict[str, Any], current_time: datetime) -> str:
         """构建场景初始化的 prompt（公共方法，避免重复）"""
-        bot_name = global_config.bot.nickname
-        bot_personality = getattr(global_config.personality, "personality", "")
-        bot_reply_style = getattr(global_config.personality, "reply_style", "")
-
-        return f"""【你的身份】
-你是 {bot_name}
-
-【性格特质与身份】
-{bot_personality}
-
-【回复风格】
-{bot_reply_style}
-
-【当前时间和活动】
-现在是 {current_time.strftime("%H:%M")}（{self._get_time_period(current_time)}）
-根据日程，你现在应该在：{activity['activity']}
-活动描述：{activity.get('description', '无')}
-
-【建议状态】
-建议地点：{activity.get('location', '未知')}
-建议着装：{activity.get('clothing', '普通装扮')}
-
-【初始化任务】
-请生成你此时此刻的状态，用小说化的方式呈现。
-
-1. 地点：基于建议地点，可微调（3-8字，简洁）
-2. 着装：基于建议着装，可微调（10-20字，简短描述）
-3. 场景：用第一人称（"我"）创作一段小说化的场景描写（150-300字）
-
-【场景描写要求】
-必须包含以下元素，像写小说一样：
-
-✦ 环境描写：描绘周围的场景、氛围、光线、声音等细节
-✦ 动作描写：细腻刻画你当前的动作、表情、姿态
-✦ 心理描写：适当融入内心想法、感受（可选）
-✦ 合理分段：使用换行符分段，让叙述节奏自然流畅
-
-【写作风格】
-- 使用生动的细节描写，避免空洞抽象
-- 句式富有变化，长短结合
-- 营造画面感和沉浸感
-- 避免陈词滥调，力求新鲜自然
-
-【分段建议】
-- 第一段：环境/氛围描写
-- 第二段：我的动作和状态描写
-- （可选第三段）：心理活动或补充描写
-
-【输出格式】
-严格按照JSON格式输出：
-
-```json
-{{
-  "地点": "...",
-  "着装": "...",
-  "场景": "第一段场景描写\\n\\n第二段场景描写\\n\\n第三段场景描写（如有）"
-}}
-```
-
-注意：场景内容中使用 \\n\\n 表示段落换行（两个换行符）"""
+        bot_name, bot_personality, bot_reply_style = self._get_identity()
+
+        return _INIT_PROMPT_TEMPLATE.format(
+            bot_name=bot_name,
+            bot_personality=bot_personality,
+            bot_reply_style=bot_reply_style,
+            time_hm=current_time.strftime("%H:%M"),
+            time_period=self._get_time_period(current_time),
+            activity=activity['activity'],
+            description=activity.get('description', '无'),
+            location=activity.get('location', '未知'),
+            clothing=activity.get('clothing', '普通装扮'),
+        )
 
     async def _do_initialize_scene(self, session_id: str, user_id: str, enable: bool = True) -> Tuple[bool, str, int]:
         """
@@ -300,6 +423,9 @@ class SceneCommand(BaseCommand):
             if not scene_data:
                 return await self._send_command_reply("❌ 场景初始化失败，请稍后重试", success=False)
 
+            # 写库前统一还原换行符，之后读取时无需再处理
+            scene_data["场景"] = unescape_newlines(scene_data["场景"])
+
             # 保存到数据库
             self.db.create_scene_state(
                 chat_id=session_id,
@@ -317,30 +443,14 @@ class SceneCommand(BaseCommand):
             # 初始化角色状态
             self.db.init_character_status(session_id)
 
-            # 格式化场景文本
-            scene_text = scene_data['场景'].replace('\\n\\n', '\n\n').replace('\\n', '\n')
+            scene_text = scene_data['场景']
 
             # 构建回复
+            card = _scene_card(scene_data['地点'], scene_data['着装'], scene_text)
             if enable:
-                reply = f"""✅ 场景模式已启用
-
-📍 地点：{scene_data['地点']}
-👗 着装：{scene_data['着装']}
-
-🎬 场景：
-{scene_text}
-
-现在你可以开始场景对话了~"""
+                reply = f"✅ 场景模式已启用\n\n{card}\n\n现在你可以开始场景对话了~"
             else:
-                reply = f"""✅ 场景已初始化（未启用）
-
-📍 地点：{scene_data['地点']}
-👗 着装：{scene_data['着装']}
-
-🎬 场景：
-{scene_text}
-
-使用 /scene on 启动场景模式"""
+                reply = f"✅ 场景已初始化（未启用）\n\n{card}\n\n使用 /scene on 启动场景模式"
 
             # 保存初始化场景到历史记录（让后续对话能读取到初始场景）
             self.db.add_scene_history(
@@ -365,7 +475,7 @@ class SceneCommand(BaseCommand):
 
     async def _initialize_scene(self, session_id: str, user_id: str) -> Tuple[bool, str, int]:
         """初始化场景并启用"""
-        await self.send_text("🎬 正在初始化场景...")
+        self._start_progress("🎬 正在初始化场景...")
         return await self._do_initialize_scene(session_id, user_id, enable=True)
 
     async def _resume_scene(self, session_id: str, user_id: str, last_state: dict) -> Tuple[bool, str, int]:
@@ -382,13 +492,16 @@ class SceneCommand(BaseCommand):
                 logger.warning(f"[SceneCommand] 未找到全局日程（续接模式）")
                 return await self._send_command_reply("❌ 未找到当前日程，请先使用 /sc 日程 生成日程表", success=False)
 
-            # 计算时间差（使用多格式解析）
-            from ..core.utils import parse_datetime
-            last_time = parse_datetime(last_state['last_update_time'])
-            if not last_time:
-                # 解析失败，使用当前时间作为回退
-                last_time = current_time
-            time_diff_hours = (current_time - last_time).total_seconds() / 3600
+            # 计算时间差：优先使用时间戳，旧数据没有时间戳时再解析时间字符串
+            last_ts = last_state.get('last_update_ts')
+            if last_ts:
+                time_diff_hours = (time.time() - last_ts) / 3600
+            else:
+                last_time = parse_datetime(last_state['last_update_time'])
+                if not last_time:
+                    # 解析失败，使用当前时间作为回退
+                    last_time = current_time
+                time_diff_hours = (current_time - last_time).total_seconds() / 3600
 
             # 如果时间差很小（<30分钟），直接续接
             if time_diff_hours < 0.5:
@@ -398,91 +511,33 @@ class SceneCommand(BaseCommand):
                 self.db.init_character_status(session_id)
 
                 # 处理场景中的换行符
-                scene_text = last_state['scene_description'].replace('\\n\\n', '\n\n').replace('\\n', '\n')
-
-                reply = f"""✅ 场景模式已启用（续接上次对话）
-
-📍 地点：{last_state['location']}
-👗 着装：{last_state['clothing']}
+                scene_text = unescape_newlines(last_state['scene_description'])
 
-🎬 场景：
-{scene_text}
-
-继续对话吧~"""
+                card = _scene_card(last_state['location'], last_state['clothing'], scene_text)
+                reply = f"✅ 场景模式已启用（续接上次对话）\n\n{card}\n\n继续对话吧~"
                 return await self._send_command_reply(reply)
 
             # 时间差较大，需要生成过渡
-            await self.send_text("🎬 正在生成场景过渡...")
-            bot_name = global_config.bot.nickname
-            bot_personality = getattr(global_config.personality, "personality", "")
-            bot_reply_style = getattr(global_config.personality, "reply_style", "")
-
-            prompt = f"""【你的身份】
-你是 {bot_name}
-
-【性格特质与身份】
-{bot_personality}
-
-【回复风格】
-{bot_reply_style}
-
-【上次场景状态】（{last_state['last_update_time']}）
-地点：{last_state['location']}
-着装：{last_state['clothing']}
-场景：{last_state['scene_description']}
-当时活动：{last_state['last_activity']}
-
-【当前时间和活动】（{current_time.strftime("%Y-%m-%d %H:%M:%S")}）
-现在应该在：{activity['activity']}
-活动描述：{activity.get('description', '无')}
-建议地点：{activity.get('location', '未知')}
-建议着装：{activity.get('clothing', '普通装扮')}
-
-【时间跨度】
-距离上次对话已经过去了 {time_diff_hours:.1f} 小时
-
-【任务】
-请生成一个"续接性"的场景，包含过渡说明和当前状态。
-
-1. 过渡说明：简短回顾中间发生的事（{self._get_transition_length(time_diff_hours)}）
-   - 概括时间流逝过程中的主要活动
-   - 自然过渡到当前状态
-
-2. 当前场景：用第一人称（"我"）创作小说化的场景描写（150-300字）
-   - 地点：基于当前活动判断（可能变化，也可能不变）
-   - 着装：基于当前活动判断（可能变化，也可能不变）
-   - 场景：包含环境描写、动作描写、心理描写
-
-【场景描写要求】
-必须包含以下元素，像写小说一样：
-
-✦ 环境描写：描绘周围的场景、氛围、光线、声音等细节
-✦ 动作描写：细腻刻画你当前的动作、表情、姿态
-✦ 心理描写：适当融入内心想法、感受（可选）
-✦ 合理分段：使用换行符分段，让叙述节奏自然流畅
-
-【写作风格】
-- 使用生动的细节描写，避免空洞抽象
-- 句式富有变化，长短结合
-- 营造画面感和沉浸感
-- 避免陈词滥调，力求新鲜自然
-
-【分段建议】
-- 第一段：环境/氛围描写
-- 第二段：我的动作和状态描写
-- （可选第三段）：心理活动或补充描写
-
-【输出格式】
-```json
-{{
-  "过渡说明": "简短概括中间发生的事...",
-  "地点": "...",
-  "着装": "...",
-  "场景": "第一段场景描写\\n\\n第二段场景描写\\n\\n第三段场景描写（如有）"
-}}
-```
-
-注意：场景内容中使用 \\n\\n 表示段落换行（两个换行符）"""
+            self._start_progress("🎬 正在生成场景过渡...")
+            bot_name, bot_personality, bot_reply_style = self._get_identity()
+
+            prompt = _RESUME_PROMPT_TEMPLATE.format(
+                bot_name=bot_name,
+                bot_personality=bot_personality,
+                bot_reply_style=bot_reply_style,
+                last_update_time=last_state['last_update_time'],
+                last_location=last_state['location'],
+                last_clothing=last_state['clothing'],
+                last_scene=last_state['scene_description'],
+                last_activity=last_state['last_activity'],
+                now=current_time.strftime("%Y-%m-%d %H:%M:%S"),
+                activity=activity['activity'],
+                description=activity.get('description', '无'),
+                location=activity.get('location', '未知'),
+                clothing=activity.get('clothing', '普通装扮'),
+                time_diff_hours=time_diff_hours,
+                transition_length=self._get_transition_length(time_diff_hours),
+            )
 
             # 获取当前会话的 NSFW 开关状态
             nsfw_enabled = self.db.get_nsfw_enabled(session_id)
@@ -509,17 +564,15 @@ class SceneCommand(BaseCommand):
                 self.db.enable_scene(session_id)
 
                 # 处理场景中的换行符
-                scene_text = last_state['scene_description'].replace('\\n\\n', '\n\n').replace('\\n', '\n')
-
-                reply = f"""✅ 场景模式已启用（续接上次对话）
+                scene_text = unescape_newlines(last_state['scene_description'])
 
-📍 地点：{last_state['location']}
-👗 着装：{last_state['clothing']}
-
-🎬 场景：
-{scene_text}"""
+                card = _scene_card(last_state['location'], last_state['clothing'], scene_text)
+                reply = f"✅ 场景模式已启用（续接上次对话）\n\n{card}"
                 return await self._send_command_reply(reply)
 
+            # 写库前统一还原换行符，之后读取时无需再处理
+            scene_data["场景"] = unescape_newlines(scene_data["场景"])
+
             # 更新状态
             self.db.update_scene_state(
                 chat_id=session_id,
@@ -533,20 +586,14 @@ class SceneCommand(BaseCommand):
             # 初始化角色状态（如果不存在）
             self.db.init_character_status(session_id)
 
-            # 处理场景中的换行符
-            scene_text = scene_data['场景'].replace('\\n\\n', '\n\n').replace('\\n', '\n')
+            scene_text = scene_data['场景']
 
             # 返回续接结果
-            reply = f"""✅ 场景模式已启用（续接上次对话）
-
-【时间已过去 {time_diff_hours:.1f} 小时】
-{scene_data['过渡说明']}
-
-📍 地点：{scene_data['地点']}
-👗 着装：{scene_data['着装']}
-
-🎬 场景：
-{scene_text}"""
+            card = _scene_card(scene_data['地点'], scene_data['着装'], scene_text)
+            reply = (
+                f"✅ 场景模式已启用（续接上次对话）\n\n"
+                f"【时间已过去 {time_diff_hours:.1f} 小时】\n{scene_data['过渡说明']}\n\n{card}"
+            )
 
             # 保存过渡场景到历史记录（让后续对话能读取到过渡场景）
             self.db.add_scene_history(
@@ -567,32 +614,11 @@ class SceneCommand(BaseCommand):
 
     def _get_time_period(self, dt: datetime) -> str:
         """获取时间段描述"""
-        hour = dt.hour
-        if 5 <= hour < 8:
-            return "清晨"
-        elif 8 <= hour < 12:
-            return "上午"
-        elif 12 <= hour < 14:
-            return "中午"
-        elif 14 <= hour < 18:
-            return "下午"
-        elif 18 <= hour < 20:
-            return "傍晚"
-        elif 20 <= hour < 24:
-            return "晚上"
-        else:
-            return "深夜"
+        return _HOUR_TO_PERIOD[dt.hour]
 
     def _get_transition_length(self, hours: float) -> str:
         """根据时间差决定过渡说明的长度"""
-        if hours < 1:
-            return "1句话"
-        elif hours < 4:
-            return "1-2句话"
-        elif hours < 12:
-            return "2-3句话"
-        else:
-            return "3-5句话，可能跨天"
+        return _TRANSITION_LENGTHS[bisect.bisect_right(_TRANSITION_BOUNDS, hours)]
 
     @classmethod
     def get_command_info(cls) -> CommandInfo:
@@ -1,23 +1,35 @@
 """
 日程生成与查看命令
 """
+import asyncio
+import io
 import json
-import re
+import time
 from datetime import datetime
-from typing import Tuple, Optional, List
+from typing import Any, Dict, Tuple, Optional, List
 from src.plugin_system.base.base_command import BaseCommand
 from src.plugin_system.base.component_types import CommandInfo, ComponentType
 from src.chat.message_receive.message import MessageRecv
 from src.config.config import global_config
 from src.common.logger import get_logger
-from ..core.scene_db import SceneDB
+from ..core.scene_db import SceneDB, get_scene_db
 from ..core.llm_client import LLMClientFactory
+from ._context import resolve_chat_context
+from .admin_command import SceneAdminCommand
 
 logger = get_logger("schedule_command")
 
 # 全局用户ID
 GLOBAL_SCHEDULE_USER = "global_schedule"
 
+_WEEKDAY_CN = ("星期一", "星期二", "星期三", "星期四", "星期五", "星期六", "星期日")
+
+_JSON_DECODER = json.JSONDecoder()
+
+# 日程查看回复缓存：按分钟分桶（当前活动标记随分钟变化），日程重新生成时清空
+_VIEW_CACHE: Dict[str, Tuple[float, str]] = {}
+_VIEW_CACHE_TTL = 60
+
 
 class ScheduleGenerateCommand(BaseCommand):
     """日程生成命令 - 让LLM自由发挥生成有随机性的日程"""
@@ -28,28 +40,31 @@ class ScheduleGenerateCommand(BaseCommand):
 
     def __init__(self, message: MessageRecv, plugin_config: Optional[dict] = None):
         super().__init__(message, plugin_config)
-        self.db = SceneDB()
+        self.db = get_scene_db()
         self.llm = LLMClientFactory.create_reply_client(self.get_config)
 
     async def execute(self) -> Tuple[bool, Optional[str], int]:
         """执行命令"""
         # 权限检查
-        from .admin_command import SceneAdminCommand
-        message_info = self.message.message_info
-        user_id = str(message_info.user_info.user_id)
-        platform = getattr(message_info, "platform", "")
-        group_info = getattr(message_info, "group_info", None)
-        chat_id = group_info.group_id if group_info and getattr(group_info, "group_id", None) else user_id
-
-        if not SceneAdminCommand.check_user_permission(platform, chat_id, user_id, self.get_config):
+        ctx = resolve_chat_context(self.message)
+        if not SceneAdminCommand.check_user_permission(ctx.platform, ctx.chat_id, ctx.user_id, self.get_config):
             await self.send_text("❌ 当前会话已开启管理员模式，仅管理员可使用")
             return False, "没有权限", 2
 
-        logger.info(f"[ScheduleCommand] 生成全局日程")
-        await self.send_text("📅 正在生成今日日程...")
+        logger.info("[ScheduleCommand] 生成全局日程")
+        # 提示消息在后台发送，与LLM调用并行；发送结果前先等待其送达，保证消息顺序
+        progress_task = asyncio.create_task(self.send_text("📅 正在生成今日日程..."))
 
         try:
-            result = await generate_schedule(self.db, self.llm)
+            try:
+                result = await generate_schedule(self.db, self.llm)
+            finally:
+                # 提示消息发送失败不影响日程生成结果，只记录日志
+                try:
+                    await progress_task
+                except Exception as e:
+                    logger.warning(f"发送日程生成提示失败: {e}")
+
             if result:
                 schedules, reply = result
                 await self.send_text(reply)
@@ -82,7 +97,7 @@ class ScheduleViewCommand(BaseCommand):
 
     def __init__(self, message: MessageRecv, plugin_config: Optional[dict] = None):
         super().__init__(message, plugin_config)
-        self.db = SceneDB()
+        self.db = get_scene_db()
 
     async def execute(self) -> Tuple[bool, Optional[str], int]:
         """执行命令"""
@@ -91,8 +106,14 @@ class ScheduleViewCommand(BaseCommand):
             today_weekday = today.weekday()
             today_date = today.strftime("%Y-%m-%d")
 
-            # 获取日程
-            schedules = self.db.get_day_schedules(GLOBAL_SCHEDULE_USER, today_weekday)
+            cache_key = today.strftime("%Y-%m-%d %H:%M")
+            cached = _VIEW_CACHE.get(cache_key)
+            if cached and cached[0] > time.monotonic():
+                await self.send_text(cached[1])
+                return True, "查看成功", 2
+
+            # 获取日程（与当前活动匹配共用每日日程缓存，日程写入时失效）
+            schedules = self.db.get_cached_day_schedules(GLOBAL_SCHEDULE_USER, today_weekday)
 
             # 获取生成日期
             last_generated = self.db.get_schedule_metadata(GLOBAL_SCHEDULE_USER, "last_generated")
@@ -106,6 +127,8 @@ class ScheduleViewCommand(BaseCommand):
 
             # 格式化输出
             reply = self._format_view_reply(schedules, today, last_generated, is_outdated)
+            _VIEW_CACHE.clear()
+            _VIEW_CACHE[cache_key] = (time.monotonic() + _VIEW_CACHE_TTL, reply)
             await self.send_text(reply)
             return True, "查看成功", 2
 
@@ -117,38 +140,21 @@ class ScheduleViewCommand(BaseCommand):
     def _format_view_reply(self, schedules: List[dict], today: datetime,
                            last_generated: Optional[str], is_outdated: bool) -> str:
         """格式化查看回复"""
-        weekday_names = {
-            0: "星期一", 1: "星期二", 2: "星期三", 3: "星期四",
-            4: "星期五", 5: "星期六", 6: "星期日"
-        }
-        weekday_cn = weekday_names[today.weekday()]
+        weekday_cn = _WEEKDAY_CN[today.weekday()]
         date_str = today.strftime("%Y年%m月%d日")
         current_time = today.strftime("%H:%M")
 
-        lines = []
+        buf = io.StringIO()
+        w = buf.write
 
         if is_outdated:
-            lines.append("⚠️ 日程已过期，建议重新生成\n")
+            w("⚠️ 日程已过期，建议重新生成\n\n")
 
-        lines.append(f"📅 【{date_str} {weekday_cn}】")
-        lines.append(f"当前时间: {current_time}\n")
+        w(f"📅 【{date_str} {weekday_cn}】\n当前时间: {current_time}\n\n")
 
         # 找到当前活动
         current_minutes = today.hour * 60 + today.minute
-        current_activity_idx = -1
-
-        for idx, item in enumerate(schedules):
-            try:
-                start_parts = item.get('time_start', '00:00').split(':')
-                end_parts = item.get('time_end', '00:00').split(':')
-                start_min = int(start_parts[0]) * 60 + int(start_parts[1]) if len(start_parts) >= 2 else 0
-                end_min = int(end_parts[0]) * 60 + int(end_parts[1]) if len(end_parts) >= 2 else 0
-
-                if start_min <= current_minutes < end_min:
-                    current_activity_idx = idx
-                    break
-            except (ValueError, IndexError):
-                continue
+        current_activity_idx = _find_current_index(schedules, current_minutes)
 
         # 输出日程
         for idx, item in enumerate(schedules):
@@ -164,10 +170,10 @@ class ScheduleViewCommand(BaseCommand):
             else:
                 prefix = " "
 
-            line = f"{prefix} {time_range}  {activity}"
+            w(f"{prefix} {time_range}  {activity}")
             if location:
-                line += f" @ {location}"
-            lines.append(line)
+                w(f" @ {location}")
+            w("\n")
 
             # 显示详情
             details = []
@@ -176,13 +182,12 @@ class ScheduleViewCommand(BaseCommand):
             if clothing:
                 details.append(f"着装: {clothing}")
             if details:
-                lines.append(f"    └ {' | '.join(details)}")
+                w(f"    └ {' | '.join(details)}\n")
 
-        lines.append("")
         if last_generated:
-            lines.append(f"生成于: {last_generated}")
+            w(f"\n生成于: {last_generated}")
 
-        return "\n".join(lines)
+        return buf.getvalue()
 
     @classmethod
     def get_command_info(cls) -> CommandInfo:
@@ -194,39 +199,47 @@ class ScheduleViewCommand(BaseCommand):
         )
 
 
-# ==================== 核心生成逻辑 ====================
+def _find_current_index(schedules: List[dict], current_minutes: int) -> int:
+    """按顺序查找当前时间所在的第一个活动，未命中返回 -1（日程可能时间重叠）"""
+    for idx, item in enumerate(schedules):
+        start_min = item.get('start_min')
+        if start_min is None:
+            # 旧数据没有预先计算的分钟数，退回解析 HH:MM
+            start_min = SceneDB._time_to_minutes(item.get('time_start', ''))
+        end_min = item.get('end_min')
+        if end_min is None:
+            end_min = SceneDB._time_to_minutes(item.get('time_end', ''))
+        if start_min is not None and end_min is not None and start_min <= current_minutes < end_min:
+            return idx
+    return -1
 
-def _get_bot_config() -> dict:
-    """获取bot配置"""
-    return {
-        "name": global_config.bot.nickname,
-        "personality": getattr(global_config.personality, "personality", ""),
-        "reply_style": getattr(global_config.personality, "reply_style", "")
-    }
 
+# ==================== 核心生成逻辑 ====================
+
+# (bot配置对象, 人格配置对象, (昵称, 人设, 回复风格))，配置重载后对象变化即失效
+_bot_config_cache: Tuple[Any, Any, Tuple[str, str, str]] = (None, None, ("", "", ""))
 
-def _build_schedule_prompt(bot_config: dict) -> str:
-    """构建日程生成prompt - 让LLM自由发挥"""
-    today = datetime.now()
-    weekday_names = {
-        0: "星期一", 1: "星期二", 2: "星期三", 3: "星期四",
-        4: "星期五", 5: "星期六", 6: "星期日"
-    }
-    weekday_cn = weekday_names[today.weekday()]
-    date_str = today.strftime("%Y年%m月%d日")
-    is_weekend = today.weekday() >= 5
 
-    return f"""【角色信息】
-名字：{bot_config['name']}
+def _get_bot_config() -> Tuple[str, str, str]:
+    """获取 (昵称, 人设, 回复风格)，配置重载前复用缓存"""
+    global _bot_config_cache
+    bot_config = global_config.bot
+    personality_config = global_config.personality
+    cached_bot, cached_personality, identity = _bot_config_cache
+    if bot_config is cached_bot and personality_config is cached_personality:
+        return identity
 
-【性格与身份】
-{bot_config['personality']}
+    identity = (
+        bot_config.nickname,
+        getattr(personality_config, "personality", ""),
+        getattr(personality_config, "reply_style", ""),
+    )
+    _bot_config_cache = (bot_config, personality_config, identity)
+    return identity
 
-【今天】
-{date_str} {weekday_cn}
-{"周末，可以放松一下" if is_weekend else "工作日"}
 
-【任务】
+# 日程prompt的固定部分，逐字节不变，放在最前面以便命中服务端的前缀缓存
+_SCHEDULE_PROMPT_PREFIX = """【任务】
 根据角色的身份和性格，生成今天的日程安排。
 
 【核心要求】
@@ -255,69 +268,70 @@ def _build_schedule_prompt(bot_config: dict) -> str:
 
 【输出】
 ```json
-{{
+{
   "schedule": [
-    {{
+    {
       "time_start": "07:23",
       "time_end": "07:45",
       "activity": "赖床起床",
       "description": "闹钟响了两遍才爬起来，有点困",
       "location": "卧室",
       "clothing": "睡衣"
-    }}
+    }
   ]
-}}
+}
 ```
 
-生成完整的今日日程（从起床到睡觉），要有随机性和变化："""
+"""
 
 
-def _parse_schedule_json(llm_response: str) -> Optional[dict]:
-    """解析LLM返回的JSON"""
-    try:
-        json_match = re.search(r'```json\s*(.*?)\s*```', llm_response, re.DOTALL)
-        if json_match:
-            json_str = json_match.group(1)
-        else:
-            # 尝试找到JSON对象
-            json_match = re.search(r'\{[\s\S]*"schedule"[\s\S]*\}', llm_response)
-            if json_match:
-                json_str = json_match.group(0)
-            else:
-                json_str = llm_response
+def _build_schedule_prompt(bot_config: Tuple[str, str, str]) -> str:
+    """构建日程生成prompt - 固定前缀在前，角色与日期等变化部分追加在后"""
+    today = datetime.now()
+    weekday_cn = _WEEKDAY_CN[today.weekday()]
+    date_str = today.strftime("%Y年%m月%d日")
+    is_weekend = today.weekday() >= 5
+    bot_name, bot_personality, _ = bot_config
 
-        schedules = json.loads(json_str)
+    return _SCHEDULE_PROMPT_PREFIX + f"""【角色信息】
+名字：{bot_name}
 
-        if "schedule" not in schedules:
-            logger.warning("日程JSON缺少 schedule 字段")
-            return None
+【性格与身份】
+{bot_personality}
 
-        if not isinstance(schedules["schedule"], list):
-            logger.warning("schedule 字段不是列表")
-            return None
+【今天】
+{date_str} {weekday_cn}
+{"周末，可以放松一下" if is_weekend else "工作日"}
 
-        return schedules
+生成完整的今日日程（从起床到睡觉），要有随机性和变化："""
 
-    except json.JSONDecodeError as e:
-        logger.error(f"JSON解析失败: {e}")
-        return None
-    except Exception as e:
-        logger.error(f"解析日程时出错: {e}")
-        return None
+
+def _parse_schedule_json(llm_response: str) -> Optional[dict]:
+    """解析LLM返回的JSON：从每个 '{' 处尝试解码，取第一个带 schedule 列表的对象"""
+    idx = llm_response.find('{')
+    while idx != -1:
+        try:
+            obj, _ = _JSON_DECODER.raw_decode(llm_response, idx)
+        except json.JSONDecodeError:
+            pass
+        else:
+            if isinstance(obj, dict) and isinstance(obj.get("schedule"), list):
+                return obj
+        idx = llm_response.find('{', idx + 1)
+
+    logger.warning("LLM返回中未找到包含 schedule 列表的JSON")
+    return None
 
 
 def _format_schedule_reply(schedules: dict) -> str:
     """格式化日程回复"""
-    weekday_names = {
-        0: "星期一", 1: "星期二", 2: "星期三", 3: "星期四",
-        4: "星期五", 5: "星期六", 6: "星期日"
-    }
     today = datetime.now()
-    weekday_cn = weekday_names[today.weekday()]
+    weekday_cn = _WEEKDAY_CN[today.weekday()]
     date_str = today.strftime("%Y年%m月%d日")
 
-    lines = [f"📅 今日日程生成成功！\n"]
-    lines.append(f"【{date_str} {weekday_cn}】\n")
+    buf = io.StringIO()
+    w = buf.write
+    w(f"📅 今日日程生成成功！\n\n【{date_str} {weekday_cn}】\n\n")
 
     for item in schedules.get("schedule", []):
         time_start = item.get('time_start', '??:??')
@@ -327,18 +341,15 @@ def _format_schedule_reply(schedules: dict) -> str:
         location = item.get('location', '')
         desc = item.get('description', '')
 
-        line = f"  {time_range}  {activity}"
+        w(f"  {time_range}  {activity}")
         if location:
-            line += f" @ {location}"
+            w(f" @ {location}")
         if desc:
-            line += f"\n    └ {desc}"
-        lines.append(line)
+            w(f"\n    └ {desc}")
+        w("\n")
 
-    lines.append("")
-    lines.append("使用 /sc schedule view 查看日程")
-    lines.append("使用 /sc on 开始场景对话")
-
-    return "\n".join(lines)
+    w("\n使用 /sc schedule view 查看日程\n使用 /sc on 开始场景对话")
+    return buf.getvalue()
 
 
 async def generate_schedule(db: SceneDB, llm_client) -> Optional[Tuple[dict, str]]:
@@ -352,11 +363,11 @@ async def generate_schedule(db: SceneDB, llm_client) -> Optional[Tuple[dict, str
         bot_config = _get_bot_config()
         prompt = _build_schedule_prompt(bot_config)
 
-        logger.debug(f"日程生成Prompt:\n{prompt}")
+        logger.debug("日程生成Prompt:\n%s", prompt)
 
         llm_response, _ = await llm_client.generate_response_async(prompt)
 
-        logger.debug(f"LLM返回:\n{llm_response}")
+        logger.debug("LLM返回:\n%s", llm_response)
 
         schedules = _parse_schedule_json(llm_response)
 
@@ -369,14 +380,14 @@ async def generate_schedule(db: SceneDB, llm_client) -> Optional[Tuple[dict, str
         today_weekday = today.weekday()
         today_date = today.strftime("%Y-%m-%d")
 
-        db.clear_user_schedules(GLOBAL_SCHEDULE_USER)
-        for item in schedules["schedule"]:
-            db.save_schedule(GLOBAL_SCHEDULE_USER, today_weekday, item)
-
-        # 保存生成日期
-        db.set_schedule_metadata(GLOBAL_SCHEDULE_USER, "last_generated", today_date)
+        # 清空旧日程、写入新日程和生成日期在同一事务内完成
+        db.save_schedules_bulk(
+            GLOBAL_SCHEDULE_USER, today_weekday, schedules["schedule"],
+            metadata={"last_generated": today_date}
+        )
+        _VIEW_CACHE.clear()
 
-        logger.info(f"日程已保存，生成日期: {today_date}")
+        logger.info("日程已保存，生成日期: %s", today_date)
 
         reply = _format_schedule_reply(schedules)
         return schedules, reply
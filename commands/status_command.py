@@ -1,16 +1,85 @@
 """
 状态栏显示命令
 """
+import io
 import json
+import time
+from collections import ChainMap
+from functools import lru_cache
 from typing import Tuple, Optional, Dict, Any
 from src.plugin_system.base.base_command import BaseCommand
 from src.plugin_system.base.component_types import CommandInfo, ComponentType
 from src.chat.message_receive.message import MessageRecv
 from src.common.logger import get_logger
-from ..core.scene_db import SceneDB
+from ..core.scene_db import get_scene_db
+from ..core.utils import json_loads, json_loads_str_list
+from ._context import resolve_chat_context
+from .admin_command import SceneAdminCommand
 
 logger = get_logger("status_command")
 
+# 短时间内重复查看同一会话的状态时直接复用上一次的回复
+_STATUS_COALESCE_WINDOW = 0.5
+_recent_status: Dict[str, Tuple[float, str]] = {}
+
+# 角色状态中以JSON文本存储的字段及其解析失败时的默认值类型
+_JSON_FIELDS = (
+    ("fetishes", dict),
+    ("inventory", list),
+    ("semen_sources", list),
+    ("vaginal_foreign", list),
+    ("permanent_mods", dict),
+    ("body_condition", dict),
+)
+
+
+# 视为空值的JSON文本
+_EMPTY_JSON_LITERALS = frozenset(("{}", "[]", "null"))
+
+# 状态栏中始终显示的部分，预先写成模板，缺失字段取 _STATUS_DEFAULTS 中的默认值
+_STATUS_DEFAULTS = {
+    "physiological_state": "呼吸平稳",
+    "vaginal_state": "放松",
+    "vaginal_wetness": "正常",
+    "pleasure_value": 0,
+    "pleasure_threshold": 100,
+    "corruption_level": 0,
+}
+_STATUS_HEAD_TPL = (
+    "━━━ 角色状态 ━━━\n\n【身体状态】\n"
+    "  生理: {physiological_state}\n"
+    "  阴道: {vaginal_state} | 湿润度: {vaginal_wetness}\n"
+)
+_STATUS_PLEASURE_TPL = (
+    "\n【快感状态】\n"
+    "  快感值: {pleasure_value}/{pleasure_threshold}\n"
+    "  污染度: {corruption_level}\n"
+)
+
+
+@lru_cache(maxsize=256)
+def _parse_json_fields(raw_fields: Tuple[Optional[str], ...]) -> Dict[str, Any]:
+    """按原始JSON文本缓存解析结果，文本不变即命中；返回值为共享对象，只读使用"""
+    parsed = {}
+    for (field, default_type), text in zip(_JSON_FIELDS, raw_fields):
+        # 空值与空字面量（最常见的情况）不经过解析器
+        if not text or text in _EMPTY_JSON_LITERALS:
+            parsed[field] = default_type()
+            continue
+        try:
+            # 列表字段均为字符串数组，走专用的快速解析
+            parsed[field] = json_loads_str_list(text) if default_type is list else json_loads(text)
+        except json.JSONDecodeError:
+            logger.warning(f"JSON解析失败: {field}={text}")
+            parsed[field] = default_type()
+    return parsed
+
+
+def _load_json_fields(status: dict) -> Dict[str, Any]:
+    """一次性解析状态中的全部JSON字段，单个字段失败时退回默认值"""
+    get = status.get
+    return _parse_json_fields(tuple(get(field) for field, _ in _JSON_FIELDS))
+
 
 class StatusCommand(BaseCommand):
     """状态栏显示命令 - /sc status [history|reset]"""
@@ -21,25 +90,17 @@ class StatusCommand(BaseCommand):
 
     def __init__(self, message: MessageRecv, plugin_config: Optional[dict] = None):
         super().__init__(message, plugin_config)
-        self.db = SceneDB()
+        self.db = get_scene_db()
 
     async def execute(self) -> Tuple[bool, Optional[str], int]:
         """执行命令"""
-        stream_id = self.message.chat_stream.stream_id
-        user_info = getattr(self.message.message_info, "user_info", None)
-        user_id = str(getattr(user_info, "user_id", ""))
-        session_id, _ = self._resolve_session_id(stream_id, user_id)
+        ctx = resolve_chat_context(self.message)
+        session_id, _ = self._resolve_session_id(ctx.stream_id, ctx.user_id)
 
-        logger.info(f"[StatusCommand] 查看状态: {session_id}")
+        logger.info("[StatusCommand] 查看状态: %s", session_id)
 
         # 权限检查
-        from .admin_command import SceneAdminCommand
-        message_info = self.message.message_info
-        platform = getattr(message_info, "platform", "")
-        group_info = getattr(message_info, "group_info", None)
-        chat_id = group_info.group_id if group_info and getattr(group_info, "group_id", None) else user_id
-
-        if not SceneAdminCommand.check_user_permission(platform, chat_id, user_id, self.get_config):
+        if not SceneAdminCommand.check_user_permission(ctx.platform, ctx.chat_id, ctx.user_id, self.get_config):
             await self.send_text("❌ 当前会话已开启管理员模式，仅管理员可使用")
             return False, "没有权限", 2
 
@@ -56,6 +117,12 @@ class StatusCommand(BaseCommand):
 
     async def _handle_status(self, session_id: str) -> Tuple[bool, Optional[str], int]:
         """显示当前状态"""
+        now = time.monotonic()
+        recent = _recent_status.get(session_id)
+        if recent and now - recent[0] < _STATUS_COALESCE_WINDOW:
+            await self.send_text(recent[1])
+            return True, recent[1], 2
+
         # 获取角色状态
         status = self.db.get_character_status(session_id)
 
@@ -71,6 +138,9 @@ class StatusCommand(BaseCommand):
 
         # 格式化状态栏（精简易读）
         reply = self._format_status(status)
+        if len(_recent_status) >= 256:
+            _recent_status.clear()
+        _recent_status[session_id] = (now, reply)
         await self.send_text(reply)
         return True, reply, 2
 
@@ -90,8 +160,9 @@ class StatusCommand(BaseCommand):
             timestamp = record.get("timestamp", "未知时间")
             location = record.get("location", "未知")
             clothing = record.get("clothing", "未知")
-            user_msg = record.get("user_message", "")[:30]
-            if len(record.get("user_message", "")) > 30:
+            raw_msg = record.get("user_message") or ""
+            user_msg = raw_msg[:30]
+            if len(raw_msg) > 30:
                 user_msg += "..."
 
             lines.append(f"{idx}. [{timestamp}]")
@@ -116,6 +187,7 @@ class StatusCommand(BaseCommand):
             return True, reply, 2
 
         # 清除并重新初始化
+        _recent_status.pop(session_id, None)
         self.db.clear_character_status(session_id)
         self.db.init_character_status(session_id)
 
@@ -126,95 +198,83 @@ class StatusCommand(BaseCommand):
     def _format_status(self, status: dict) -> str:
         """格式化状态栏输出（精简版）"""
         # 解析 JSON 字段
-        fetishes = self._safe_load_json(status.get('fetishes', '{}'))
-        inventory = self._safe_load_json(status.get('inventory', '[]'))
-        semen_sources = self._safe_load_json(status.get('semen_sources', '[]'))
-        vaginal_foreign = self._safe_load_json(status.get('vaginal_foreign', '[]'))
-        permanent_mods = self._safe_load_json(status.get('permanent_mods', '{}'))
-        body_condition = self._safe_load_json(status.get('body_condition', '{}'))
-
-        lines = ["━━━ 角色状态 ━━━\n"]
+        get = status.get
+        fields = ChainMap(status, _STATUS_DEFAULTS)
+        parsed = _load_json_fields(status)
+        fetishes = parsed['fetishes']
+        inventory = parsed['inventory']
+        semen_sources = parsed['semen_sources']
+        vaginal_foreign = parsed['vaginal_foreign']
+        permanent_mods = parsed['permanent_mods']
+        body_condition = parsed['body_condition']
+
+        buf = io.StringIO()
+        w = buf.write
+        writelines = buf.writelines
 
         # 身体与生理
-        lines.append("【身体状态】")
-        lines.append(f"  生理: {status.get('physiological_state', '呼吸平稳')}")
-        lines.append(f"  阴道: {status.get('vaginal_state', '放松')} | 湿润度: {status.get('vaginal_wetness', '正常')}")
+        w(_STATUS_HEAD_TPL.format_map(fields))
 
         # 阴道容量（如果不是默认值）
-        vaginal_capacity = status.get('vaginal_capacity', 100)
+        vaginal_capacity = get('vaginal_capacity', 100)
         if vaginal_capacity != 100:
-            lines.append(f"  阴道容量: {vaginal_capacity}")
+            w(f"  阴道容量: {vaginal_capacity}\n")
 
         # 后穴开发度（如果大于0）
-        anal_dev = status.get('anal_development', 0)
+        anal_dev = get('anal_development', 0)
         if anal_dev > 0:
-            lines.append(f"  后穴开发度: {anal_dev}/100")
+            w(f"  后穴开发度: {anal_dev}/100\n")
 
-        pregnancy = status.get('pregnancy_status', '未受孕')
+        pregnancy = get('pregnancy_status', '未受孕')
         if pregnancy == '受孕中':
-            source = status.get('pregnancy_source', '未知')
-            counter = status.get('pregnancy_counter', 0)
-            lines.append(f"  子宫: {pregnancy} ({source}, {counter}天)")
+            source = get('pregnancy_source', '未知')
+            counter = get('pregnancy_counter', 0)
+            w(f"  子宫: {pregnancy} ({source}, {counter}天)\n")
         else:
-            lines.append(f"  子宫: {pregnancy}")
+            w(f"  子宫: {pregnancy}\n")
 
-        semen_vol = status.get('semen_volume', 0)
+        semen_vol = get('semen_volume', 0)
         if semen_vol > 0:
             sources_str = ", ".join(semen_sources) if semen_sources else "未知"
-            lines.append(f"  体内精液: {semen_vol}ml (来源: {sources_str})")
+            w(f"  体内精液: {semen_vol}ml (来源: {sources_str})\n")
 
         # 阴道内异物（如果有）
         if vaginal_foreign:
-            foreign_str = ", ".join(vaginal_foreign)
-            lines.append(f"  阴道内异物: {foreign_str}")
+            w(f"  阴道内异物: {', '.join(vaginal_foreign)}\n")
 
         # 身体部位状况（如果有）
         if body_condition:
-            lines.append("\n【部位状况】")
-            for part, condition in body_condition.items():
-                lines.append(f"  {part}: {condition}")
+            w("\n【部位状况】\n")
+            writelines(f"  {part}: {condition}\n" for part, condition in body_condition.items())
 
         # 快感与成长
-        lines.append("\n【快感状态】")
-        pleasure = status.get('pleasure_value', 0)
-        threshold = status.get('pleasure_threshold', 100)
-        corruption = status.get('corruption_level', 0)
-        lines.append(f"  快感值: {pleasure}/{threshold}")
-        lines.append(f"  污染度: {corruption}")
+        w(_STATUS_PLEASURE_TPL.format_map(fields))
 
         # 永久性改造（如果有）
         if permanent_mods:
-            lines.append("\n【永久改造】")
-            for mod_type, description in permanent_mods.items():
-                lines.append(f"  {mod_type}: {description}")
+            w("\n【永久改造】\n")
+            writelines(f"  {mod_type}: {description}\n" for mod_type, description in permanent_mods.items())
 
         # 性癖（如果有）
         if fetishes:
-            lines.append("\n【性癖】")
+            w("\n【性癖】\n")
             for name, data in fetishes.items():
-                if isinstance(data, dict):
+                try:
                     exp = data.get('经验', 0)
                     level = data.get('等级', 0)
-                    lines.append(f"  {name}: Lv{level} ({exp}exp)")
+                except AttributeError:  # 非字典的脏数据直接跳过
+                    continue
+                w(f"  {name}: Lv{level} ({exp}exp)\n")
 
         # 道具栏（如果有）
         if inventory:
-            lines.append("\n【道具】")
-            for item in inventory[:5]:  # 最多显示5个
-                lines.append(f"  • {item}")
+            w("\n【道具】\n")
+            writelines(f"  • {item}\n" for item in inventory[:5])  # 最多显示5个
             if len(inventory) > 5:
-                lines.append(f"  ... 还有 {len(inventory) - 5} 个道具")
-
-        lines.append("\n━━━━━━━━━━━━━━")
-        return "\n".join(lines)
+                w(f"  ... 还有 {len(inventory) - 5} 个道具\n")
 
-    def _safe_load_json(self, text: str) -> Any:
-        """安全加载JSON字符串"""
-        try:
-            return json.loads(text) if text else {}
-        except json.JSONDecodeError:
-            logger.warning(f"JSON解析失败: {text}")
-            return {} if text.startswith('{') else []
+        w("\n━━━━━━━━━━━━━━")
+        return buf.getvalue()
 
     def _resolve_session_id(self, stream_id: str, user_id: str) -> Tuple[str, Optional[Dict[str, Any]]]:
         """解析真实会话ID，兼容旧数据结构"""
@@ -1,13 +1,13 @@
 """
 场景格式插件核心模块
 """
-from .scene_db import SceneDB
+from .scene_db import SceneDB, get_scene_db
 from .llm_client import LLMClient, LLMClientFactory
 from .nai_client import NaiClient
-from .preset_manager import PresetManager
+from .preset_manager import PresetManager, get_preset_manager
 from .utils import (
-    safe_json_loads, parse_json_response, parse_structured_text,
-    collapse_text, truncate_text, parse_datetime,
+    json_loads, json_loads_str_list, json_dumps, json_dumps_bytes, safe_json_loads, parse_json_response, parse_structured_text,
+    collapse_text, truncate_text, collapse_and_truncate, unescape_newlines, parse_datetime,
     parse_status_json_fields, build_session_id,
     normalize_planner_decision, get_default_decision
 )
@@ -22,16 +22,16 @@ from .scene_generator import SceneGenerator
 
 __all__ = [
     # 数据库
-    "SceneDB",
+    "SceneDB", "get_scene_db",
     # LLM
     "LLMClient", "LLMClientFactory",
     # NAI
     "NaiClient",
     # 预设
-    "PresetManager",
+    "PresetManager", "get_preset_manager",
     # 工具函数
-    "safe_json_loads", "parse_json_response", "parse_structured_text",
-    "collapse_text", "truncate_text", "parse_datetime",
+    "json_loads", "json_loads_str_list", "json_dumps", "json_dumps_bytes", "safe_json_loads", "parse_json_response", "parse_structured_text",
+    "collapse_text", "truncate_text", "collapse_and_truncate", "unescape_newlines", "parse_datetime",
     "parse_status_json_fields", "build_session_id",
     "normalize_planner_decision", "get_default_decision",
     # 状态管理
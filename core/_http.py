@@ -0,0 +1,108 @@
+"""
+插件共用的 HTTP session - LLM 与 NAI 客户端共享同一个连接池，复用长连接与 DNS 缓存
+"""
+import asyncio
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Hashable, Optional
+
+import aiohttp
+
+_SESSION: Optional[aiohttp.ClientSession] = None
+
+# 各 API 端点的令牌桶限流器
+_RATE_LIMITERS: Dict[Hashable, "TokenBucket"] = {}
+
+
+async def get_shared_session() -> aiohttp.ClientSession:
+    """获取共享的 aiohttp session（首次调用时创建，超时由各请求自行设置）"""
+    global _SESSION
+    # 创建过程不会让出事件循环，无需加锁
+    if _SESSION is None or _SESSION.closed:
+        connector = aiohttp.TCPConnector(
+            limit=100, limit_per_host=32, ttl_dns_cache=300, keepalive_timeout=60
+        )
+        _SESSION = aiohttp.ClientSession(connector=connector)
+    return _SESSION
+
+
+async def close_shared_session():
+    """关闭共享的 session（插件卸载时调用）"""
+    global _SESSION
+    session, _SESSION = _SESSION, None
+    if session and not session.closed:
+        await session.close()
+
+
+class TokenBucket:
+    """令牌桶限流器：按固定速率补充令牌，允许短时突发"""
+
+    __slots__ = ("rate", "burst", "_tokens", "_updated", "_lock")
+
+    def __init__(self, rate: float, burst: int):
+        """
+        Args:
+            rate: 每秒补充的令牌数
+            burst: 桶容量（允许的最大突发请求数）
+        """
+        self.rate = rate
+        self.burst = burst
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        """取走一个令牌，令牌不足时等待补充（等待者按先后顺序放行）"""
+        async with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens < 1:
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+                self._tokens = 1.0
+                self._updated = time.monotonic()
+            self._tokens -= 1
+
+
+def get_rate_limiter(key: Hashable, rate: float, burst: int) -> Optional[TokenBucket]:
+    """
+    获取指定端点的限流器（同一端点且限速配置相同的客户端共用）
+
+    Args:
+        key: 端点标识
+        rate: 每秒请求数，小于等于 0 表示不限速
+        burst: 允许的突发请求数
+
+    Returns:
+        限流器，不限速时返回 None
+    """
+    if rate <= 0:
+        return None
+    # 限速配置也作为键的一部分，配置修改后立即按新速率放行
+    limiter_key = (key, rate, burst)
+    limiter = _RATE_LIMITERS.get(limiter_key)
+    if limiter is None:
+        limiter = _RATE_LIMITERS[limiter_key] = TokenBucket(rate, burst)
+    return limiter
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """
+    解析 Retry-After 响应头
+
+    Args:
+        value: 秒数或 HTTP 日期
+
+    Returns:
+        需要等待的秒数，缺失或无法解析时返回 None
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
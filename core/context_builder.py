@@ -2,17 +2,24 @@
 上下文构建模块
 负责构建对话历史上下文
 """
-from typing import Dict, Any, List, Optional, Callable
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Callable, Tuple
 from .utils import collapse_text
 from .scene_db import SceneDB
 
 
+# 上下文缓存的最大条目数
+_CONTEXT_CACHE_SIZE = 128
+
+
 class ContextBuilder:
     """上下文构建器"""
 
     def __init__(self, db: SceneDB, get_config: Callable):
         self.db = db
         self.get_config = get_config
+        # (会话ID, 条数, 最新历史ID) -> 上下文文本；有新历史写入时最新ID变化，旧条目自然失效
+        self._ctx_cache: "OrderedDict[Tuple[str, int, Optional[int]], str]" = OrderedDict()
 
     def build_context_block(self, session_id: Optional[str], context_type: str = "reply") -> str:
         """
@@ -28,6 +35,33 @@ class ContextBuilder:
         if not session_id:
             return ""
 
+        # 每次读取配置，配置重载后立即生效
+        limit = self._resolve_limit(context_type)
+        if limit == 0:
+            return ""
+
+        if not self.db:
+            return "【最近场景对话】暂无历史记录"
+
+        cache_key = (session_id, limit, self.db.get_latest_history_id(session_id))
+        cached = self._ctx_cache.get(cache_key)
+        if cached is not None:
+            self._ctx_cache.move_to_end(cache_key)
+            return cached
+
+        history = self.db.get_recent_history(session_id, limit)
+        if history:
+            context = self._build_dialogue_context(history)
+        else:
+            context = "【最近场景对话】暂无历史记录"
+
+        self._ctx_cache[cache_key] = context
+        if len(self._ctx_cache) > _CONTEXT_CACHE_SIZE:
+            self._ctx_cache.popitem(last=False)
+        return context
+
+    def _resolve_limit(self, context_type: str) -> int:
+        """读取配置中的上下文条数，限制在 0-50 之间"""
         try:
             if context_type == "planner":
                 config_key = "scene.planner_context_messages"
@@ -41,35 +75,29 @@ class ContextBuilder:
         except (TypeError, ValueError):
             limit = default_limit if context_type == "reply" else 1
 
-        limit = max(0, min(limit, 50))
-        if limit == 0:
-            return ""
-
-        history = self.db.get_recent_history(session_id, limit) if self.db else []
-
-        if not history:
-            return "【最近场景对话】暂无历史记录"
-
-        return self._build_dialogue_context(history)
+        return max(0, min(limit, 50))
 
     def _build_dialogue_context(self, history: List[Dict]) -> str:
         """构建对话形式的上下文，交替展示用户和Bot的内容"""
         total = len(history)
         lines: List[str] = [f"【最近场景对话】（共{total}轮）"]
+        append = lines.append
 
         for record in history:
-            user_msg = record.get("user_message") or ""
-            # 优先使用干净的场景描述，避免格式化边框污染上下文
-            scene_desc = record.get("scene_description") or ""
-            location = record.get("location") or ""
-            clothing = record.get("clothing") or ""
-
+            get = record.get
+            user_msg = get("user_message")
             if user_msg:
-                lines.append(f"用户：{user_msg}")
+                append(f"用户：{user_msg}")
+
+            # 优先使用干净的场景描述，避免格式化边框污染上下文；无描述时无需再取地点和着装
+            scene_desc = get("scene_description")
+            if not scene_desc:
+                continue
 
             # 构建干净的Bot回复（无边框噪音）
-            if scene_desc:
-                bot_context = f"[{location}][{clothing}] {scene_desc}" if location and clothing else scene_desc
-                lines.append(f"Bot：{bot_context}")
+            location = get("location")
+            clothing = get("clothing")
+            bot_context = f"[{location}][{clothing}] {scene_desc}" if location and clothing else scene_desc
+            append(f"Bot：{bot_context}")
 
         return "\n".join(lines)
@@ -4,12 +4,23 @@
 优化版本：添加 session 复用、更好的错误处理
 """
 import asyncio
+import random
 import aiohttp
 from typing import Optional, Dict, Any, Tuple
 from src.common.logger import get_logger
+from .utils import json_loads, json_dumps_bytes
+from ._http import get_shared_session, get_rate_limiter, parse_retry_after
 
 logger = get_logger("scene_llm_client")
 
+# 可重试的 HTTP 状态码（限流与临时性服务端错误）
+_RETRYABLE_STATUS = frozenset({429, 500, 502, 503, 504})
+# 单次重试等待的上限（秒）
+_MAX_RETRY_DELAY = 30.0
+# 同一 API 端点与模型的默认请求速率上限（每秒请求数，0 表示不限速）及允许的突发数
+_RATE_LIMIT = 5.0
+_RATE_BURST = 10
+
 
 class LLMClient:
     """
@@ -17,6 +28,12 @@ class LLMClient:
     支持 OpenAI 兼容的 API 格式（OpenAI, Claude, DeepSeek 等）
     """
 
+    __slots__ = (
+        "base_url", "api_key", "model", "temperature", "max_tokens",
+        "timeout", "max_retries", "retry_interval", "extra_params", "_request_timeout",
+        "rate_limit", "rate_burst", "_url", "_headers", "_base_payload", "_limiter",
+    )
+
     def __init__(
         self,
         base_url: str,
@@ -27,7 +44,9 @@ class LLMClient:
         timeout: int = 60,
         max_retries: int = 3,
         retry_interval: float = 1.0,
-        extra_params: Optional[Dict[str, Any]] = None
+        extra_params: Optional[Dict[str, Any]] = None,
+        rate_limit: float = _RATE_LIMIT,
+        rate_burst: int = _RATE_BURST
     ):
         """
         初始化 LLM 客户端
@@ -42,6 +61,8 @@ class LLMClient:
             max_retries: 重试次数
             retry_interval: 重试间隔（秒）
             extra_params: 额外参数
+            rate_limit: 每秒请求数上限（0 表示不限速）
+            rate_burst: 允许的突发请求数
         """
         self.base_url = base_url.rstrip('/') if base_url else ""
         self.api_key = api_key or ""
@@ -52,9 +73,22 @@ class LLMClient:
         self.max_retries = self._validate_int(max_retries, 3, 1, 10)
         self.retry_interval = self._validate_float(retry_interval, 1.0, 0.1, 30.0)
         self.extra_params = extra_params or {}
-
-        # 复用的 session
-        self._session: Optional[aiohttp.ClientSession] = None
+        self.rate_limit = self._validate_float(rate_limit, _RATE_LIMIT, 0.0, 1000.0)
+        self.rate_burst = self._validate_int(rate_burst, _RATE_BURST, 1, 1000)
+        self._request_timeout = aiohttp.ClientTimeout(total=self.timeout)
+        # 请求地址、请求头与固定参数在客户端生命周期内不变，只构建一次
+        self._url = f"{self.base_url}/chat/completions"
+        self._headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        self._base_payload = {
+            "model": self.model,
+            "temperature": self.temperature,
+            "max_tokens": self.max_tokens,
+            **self.extra_params
+        }
+        self._limiter = get_rate_limiter((self.base_url, self.model), self.rate_limit, self.rate_burst)
 
     @staticmethod
     def _validate_float(value: Any, default: float, min_val: float, max_val: float) -> float:
@@ -74,18 +108,13 @@ class LLMClient:
         except (TypeError, ValueError):
             return default
 
-    async def _get_session(self) -> aiohttp.ClientSession:
-        """获取或创建 aiohttp session（复用连接）"""
-        if self._session is None or self._session.closed:
-            timeout = aiohttp.ClientTimeout(total=self.timeout)
-            self._session = aiohttp.ClientSession(timeout=timeout)
-        return self._session
-
     async def close(self):
-        """关闭 session"""
-        if self._session and not self._session.closed:
-            await self._session.close()
-            self._session = None
+        """兼容旧接口：共享 session 由 close_shared_session 统一关闭，单个实例无需处理"""
+
+    @staticmethod
+    async def _read_error_text(response: aiohttp.ClientResponse) -> str:
+        """只读取错误响应的前 1KB，日志中也只展示前 200 字"""
+        return (await response.content.read(1024)).decode("utf-8", errors="replace")
 
     async def generate_response_async(self, prompt: str) -> Tuple[str, Dict[str, Any]]:
         """
@@ -113,28 +142,24 @@ class LLMClient:
         Returns:
             (回复文本, 元数据)
         """
-        url = f"{self.base_url}/chat/completions"
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
-
-        payload = {
-            "model": self.model,
-            "messages": messages,
-            "temperature": self.temperature,
-            "max_tokens": self.max_tokens,
-            **self.extra_params
-        }
+        # 请求体只序列化一次，重试时直接复用
+        body = json_dumps_bytes({**self._base_payload, "messages": messages})
 
         last_error = None
-        session = await self._get_session()
+        session = await get_shared_session()
+        limiter = self._limiter
 
         for attempt in range(self.max_retries):
+            retry_after = None
             try:
-                async with session.post(url, headers=headers, json=payload) as response:
+                if limiter is not None:
+                    await limiter.acquire()
+                async with session.post(
+                    self._url, headers=self._headers, data=body, timeout=self._request_timeout
+                ) as response:
                     if response.status == 200:
-                        data = await response.json()
+                        # 直接解析原始字节，省去 response.json() 先解码成 str 的一遍
+                        data = json_loads(await response.read())
                         content = data["choices"][0]["message"]["content"]
                         metadata = {
                             "model": data.get("model"),
@@ -144,20 +169,18 @@ class LLMClient:
                         logger.debug(f"LLM 调用成功: model={self.model}, tokens={metadata.get('usage', {})}")
                         return content, metadata
                     elif response.status == 429:
-                        # 速率限制，等待更长时间
+                        # 速率限制，优先按服务端给出的 Retry-After 等待
                         last_error = "API 速率限制"
-                        wait_time = self.retry_interval * (attempt + 2)
-                        logger.warning(f"LLM 速率限制，等待 {wait_time}s 后重试")
-                        await asyncio.sleep(wait_time)
-                        continue
-                    elif response.status >= 500:
-                        # 服务器错误，可重试
-                        error_text = await response.text()
+                        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                        logger.warning(f"LLM 速率限制 (尝试 {attempt + 1}/{self.max_retries})")
+                    elif response.status in _RETRYABLE_STATUS:
+                        # 临时性服务器错误，可重试
+                        error_text = await self._read_error_text(response)
                         last_error = f"服务器错误 {response.status}: {error_text[:200]}"
                         logger.warning(f"LLM 服务器错误 (尝试 {attempt + 1}/{self.max_retries}): {last_error}")
                     else:
-                        # 客户端错误，不重试
-                        error_text = await response.text()
+                        # 客户端错误或不可恢复的服务端错误，不重试
+                        error_text = await self._read_error_text(response)
                         last_error = f"API 错误 {response.status}: {error_text[:200]}"
                         logger.error(f"LLM 客户端错误: {last_error}")
                         break
@@ -170,26 +193,41 @@ class LLMClient:
                 logger.warning(f"LLM 网络错误 (尝试 {attempt + 1}/{self.max_retries}): {e}")
             except Exception as e:
                 last_error = f"未知错误: {str(e)}"
-                logger.error(f"LLM 调用异常 (尝试 {attempt + 1}/{self.max_retries}): {e}", exc_info=True)
+                logger.error(f"LLM 调用异常: {e}", exc_info=True)
+                break
 
-            # 重试前等待
+            # 重试前按指数退避等待，加入随机抖动避免多个请求同时重试
             if attempt < self.max_retries - 1:
-                await asyncio.sleep(self.retry_interval)
+                if retry_after is not None:
+                    await asyncio.sleep(min(retry_after, _MAX_RETRY_DELAY))
+                else:
+                    delay = min(self.retry_interval * (2 ** attempt), _MAX_RETRY_DELAY)
+                    await asyncio.sleep(delay * (0.5 + random.random() * 0.5))
 
         logger.error(f"LLM 调用最终失败: {last_error}")
         raise Exception(f"LLM 调用失败: {last_error}")
 
-    def __del__(self):
-        """析构时尝试关闭 session"""
-        if self._session and not self._session.closed:
-            try:
-                loop = asyncio.get_event_loop()
-                if loop.is_running():
-                    loop.create_task(self.close())
-                else:
-                    loop.run_until_complete(self.close())
-            except Exception:
-                pass
+
+# 自定义 API 的配置项及默认值（键名与 LLMClient 参数一致）
+_PLANNER_DEFAULTS = {
+    "base_url": "",
+    "api_key": "",
+    "model": "",
+    "temperature": 0.7,
+    "max_tokens": 2048,
+    "timeout": 60,
+    "max_retries": 3,
+    "retry_interval": 1.0,
+    "extra_params": {},
+    "rate_limit": _RATE_LIMIT,
+    "rate_burst": _RATE_BURST,
+}
+_REPLY_DEFAULTS = {
+    **_PLANNER_DEFAULTS,
+    "temperature": 0.9,
+    "max_tokens": 4096,
+    "timeout": 120,
+}
 
 
 class LLMClientFactory:
@@ -198,6 +236,29 @@ class LLMClientFactory:
     根据配置创建合适的客户端（自定义 API 或 MaiBot 原生）
     """
 
+    # 自定义 API 客户端：section -> (配置键, 客户端)，每个 section 只保留当前配置对应的一个
+    _client_cache: Dict[str, Tuple[Tuple, LLMClient]] = {}
+
+    @classmethod
+    def _get_custom_client(cls, get_config_func, section: str, defaults: Dict[str, Any]) -> LLMClient:
+        """读取 llm.<section> 配置，相同配置复用同一个 LLMClient"""
+        prefix = f"llm.{section}."
+        params = {
+            name: get_config_func(prefix + name, default)
+            for name, default in defaults.items()
+        }
+        extra_params = params["extra_params"] or {}
+        key = (*(params[name] for name in defaults if name != "extra_params"),
+               repr(sorted(extra_params.items())))
+
+        cached = cls._client_cache.get(section)
+        if cached is not None and cached[0] == key:
+            return cached[1]
+        # 配置变化时直接替换旧客户端
+        client = LLMClient(**params)
+        cls._client_cache[section] = (key, client)
+        return client
+
     @staticmethod
     def create_planner_client(get_config_func) -> Any:
         """
@@ -212,17 +273,7 @@ class LLMClientFactory:
         use_custom = get_config_func("llm.planner.use_custom_api", False)
 
         if use_custom:
-            return LLMClient(
-                base_url=get_config_func("llm.planner.base_url", ""),
-                api_key=get_config_func("llm.planner.api_key", ""),
-                model=get_config_func("llm.planner.model", ""),
-                temperature=get_config_func("llm.planner.temperature", 0.7),
-                max_tokens=get_config_func("llm.planner.max_tokens", 2048),
-                timeout=get_config_func("llm.planner.timeout", 60),
-                max_retries=get_config_func("llm.planner.max_retries", 3),
-                retry_interval=get_config_func("llm.planner.retry_interval", 1.0),
-                extra_params=get_config_func("llm.planner.extra_params", {})
-            )
+            return LLMClientFactory._get_custom_client(get_config_func, "planner", _PLANNER_DEFAULTS)
         else:
             from src.llm_models.utils_model import LLMRequest
             from src.config.config import model_config
@@ -245,17 +296,7 @@ class LLMClientFactory:
         use_custom = get_config_func("llm.reply.use_custom_api", False)
 
         if use_custom:
-            return LLMClient(
-                base_url=get_config_func("llm.reply.base_url", ""),
-                api_key=get_config_func("llm.reply.api_key", ""),
-                model=get_config_func("llm.reply.model", ""),
-                temperature=get_config_func("llm.reply.temperature", 0.9),
-                max_tokens=get_config_func("llm.reply.max_tokens", 4096),
-                timeout=get_config_func("llm.reply.timeout", 120),
-                max_retries=get_config_func("llm.reply.max_retries", 3),
-                retry_interval=get_config_func("llm.reply.retry_interval", 1.0),
-                extra_params=get_config_func("llm.reply.extra_params", {})
-            )
+            return LLMClientFactory._get_custom_client(get_config_func, "reply", _REPLY_DEFAULTS)
         else:
             from src.llm_models.utils_model import LLMRequest
             from src.config.config import model_config
@@ -6,6 +6,7 @@ NAI 生图客户端
 import asyncio
 import aiohttp
 import base64
+import random
 import ssl
 import time
 import uuid
@@ -13,6 +14,8 @@ import imghdr
 from typing import Optional, Dict, Any, Tuple
 from pathlib import Path
 from src.common.logger import get_logger
+from ._http import get_shared_session, get_rate_limiter, parse_retry_after
+from .utils import json_loads
 
 logger = get_logger("scene_nai_client")
 
@@ -25,6 +28,12 @@ _MAX_FILES = 80
 _FILE_RETENTION_SECONDS = 30 * 60  # 30 分钟
 _LAST_CLEANUP_TIME = 0
 
+# 同一生图端点的默认请求速率上限（每秒请求数，0 表示不限速）及允许的突发数
+_RATE_LIMIT = 1.0
+_RATE_BURST = 3
+# 速率限制时单次等待的上限（秒）
+_MAX_RETRY_DELAY = 60.0
+
 
 class NaiClient:
     """
@@ -40,20 +49,9 @@ class NaiClient:
             get_config_func: 获取配置的函数
         """
         self.get_config = get_config_func
-        self._session: Optional[aiohttp.ClientSession] = None
-
-    async def _get_session(self) -> aiohttp.ClientSession:
-        """获取或创建 aiohttp session"""
-        if self._session is None or self._session.closed:
-            timeout = aiohttp.ClientTimeout(total=self._get_timeout())
-            self._session = aiohttp.ClientSession(timeout=timeout)
-        return self._session
 
     async def close(self):
-        """关闭 session"""
-        if self._session and not self._session.closed:
-            await self._session.close()
-            self._session = None
+        """兼容旧接口：共享 session 由 close_shared_session 统一关闭，单个实例无需处理"""
 
     def _get_timeout(self) -> int:
         """获取超时配置"""
@@ -113,20 +111,31 @@ class NaiClient:
         retry_interval = self._get_float_config("nai.retry_interval", 2.0, 0.5, 10.0)
 
         last_error = None
-        session = await self._get_session()
+        session = await get_shared_session()
         ssl_context = self._get_ssl_context()
+        timeout = aiohttp.ClientTimeout(total=self._get_timeout())
+        limiter = get_rate_limiter(
+            url,
+            self._get_float_config("nai.rate_limit", _RATE_LIMIT, 0.0, 100.0),
+            self._get_int_config("nai.rate_burst", _RATE_BURST, 1, 100),
+        )
 
         for attempt in range(max_retries):
+            retry_after = None
             try:
-                async with session.get(url, params=params, ssl=ssl_context) as response:
+                if limiter is not None:
+                    await limiter.acquire()
+                async with session.get(url, params=params, ssl=ssl_context, timeout=timeout) as response:
                     if response.status == 200:
                         return await self._handle_success_response(response)
                     elif response.status == 429:
                         last_error = "API 速率限制"
-                        wait_time = retry_interval * (attempt + 2)
-                        logger.warning(f"NAI 速率限制，等待 {wait_time}s 后重试")
-                        await asyncio.sleep(wait_time)
-                        continue
+                        # 优先按服务端给出的 Retry-After 等待，否则指数退避并加入随机抖动
+                        retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                        if retry_after is None:
+                            delay = min(retry_interval * (2 ** (attempt + 1)), _MAX_RETRY_DELAY)
+                            retry_after = delay * (0.5 + random.random() * 0.5)
+                        logger.warning(f"NAI 速率限制 (尝试 {attempt + 1}/{max_retries})，等待 {retry_after:.1f}s 后重试")
                     elif response.status >= 500:
                         error_text = await response.text()
                         last_error = f"服务器错误 {response.status}: {error_text[:100]}"
@@ -147,7 +156,10 @@ class NaiClient:
                 logger.error(f"NAI 生图异常 (尝试 {attempt + 1}/{max_retries}): {e}", exc_info=True)
 
             if attempt < max_retries - 1:
-                await asyncio.sleep(retry_interval)
+                if retry_after is not None:
+                    await asyncio.sleep(min(retry_after, _MAX_RETRY_DELAY))
+                else:
+                    await asyncio.sleep(retry_interval)
 
         logger.error(f"NAI 生图最终失败: {last_error}")
         return False, last_error
@@ -212,11 +224,11 @@ class NaiClient:
         content_type = response.headers.get("content-type", "")
 
         if "application/json" in content_type:
-            data = await response.json()
+            data = json_loads(await response.read())
             image_data = data.get("url") or data.get("image_url") or data.get("image") or data.get("data")
             if image_data:
                 if image_data.startswith("http"):
-                    session = await self._get_session()
+                    session = await get_shared_session()
                     image_data = await self._download_image(session, image_data)
                 file_path = self._save_image(image_data)
                 if file_path:
@@ -236,8 +248,9 @@ class NaiClient:
     async def _download_image(self, session: aiohttp.ClientSession, url: str) -> str:
         """下载图片并返回 Base64"""
         ssl_context = self._get_ssl_context()
+        timeout = aiohttp.ClientTimeout(total=self._get_timeout())
         try:
-            async with session.get(url, ssl=ssl_context) as response:
+            async with session.get(url, ssl=ssl_context, timeout=timeout) as response:
                 if response.status == 200:
                     image_bytes = await response.read()
                     return base64.b64encode(image_bytes).decode('utf-8')
@@ -309,13 +322,3 @@ class NaiClient:
 
         except Exception as e:
             logger.error(f"清理图片文件失败: {e}")
-
-    def __del__(self):
-        """析构时尝试关闭 session"""
-        if self._session and not self._session.closed:
-            try:
-                loop = asyncio.get_event_loop()
-                if loop.is_running():
-                    loop.create_task(self.close())
-            except Exception:
-                pass
@@ -3,6 +3,7 @@
 作者：泉此方
 仅保留实际起作用的提示词，移除SillyTavern相关语法
 """
+from functools import lru_cache
 
 # ==================== 主提示与角色定义 ====================
 
@@ -698,6 +699,8 @@ def get_all_style_names() -> list:
     return list(STYLES.keys())
 
 
+# 预设内容均为静态常量，规则拼接结果只取决于参数，按参数缓存
+@lru_cache(maxsize=None)
 def get_prefix_rules(include_nsfw: bool = True) -> str:
     """
     获取前置规则（放在角色信息之前）
@@ -716,6 +719,7 @@ def get_prefix_rules(include_nsfw: bool = True) -> str:
     return "\n\n".join(parts)
 
 
+@lru_cache(maxsize=256)
 def get_suffix_rules(style_name: str = None, include_summary: bool = True,
                      include_tucao: bool = True, include_cot: bool = False,
                      perspective: str = None) -> str:
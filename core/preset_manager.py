@@ -3,7 +3,7 @@
 """
 from typing import Optional, List, Dict, Any
 from src.common.logger import get_logger
-from .scene_db import SceneDB
+from .scene_db import SceneDB, get_scene_db
 from .preset_content import (
     STYLES,
     get_base_rules,
@@ -22,6 +22,16 @@ from .preset_content import (
 
 logger = get_logger("preset_manager")
 
+# 内置文风列表在模块加载时构建一次（文风内容为静态常量，运行期不会变化）
+_STYLE_LIST = tuple(
+    {"id": name, "name": name, "content_len": len(get_style(name))}
+    for name in get_all_style_names()
+)
+# 文风 id -> 文风信息索引，精确查找时无需遍历
+_STYLE_INDEX = {style["id"]: style for style in _STYLE_LIST}
+# 归一化（casefold）名称 -> 文风信息，按名称查找时只需归一化一次查询串
+_STYLE_NAME_INDEX = {style["name"].casefold(): style for style in _STYLE_LIST}
+
 
 class PresetManager:
     """预设管理器 - 使用内置 Izumi 预设内容"""
@@ -30,16 +40,8 @@ class PresetManager:
         self.db = db or SceneDB()
 
     def get_styles(self) -> List[Dict[str, str]]:
-        """获取所有可用文风"""
-        styles = []
-        for name in get_all_style_names():
-            content = get_style(name)
-            styles.append({
-                "id": name,  # 使用名称作为 ID
-                "name": name,
-                "content_len": len(content)
-            })
-        return styles
+        """获取所有可用文风（id 即文风名称）"""
+        return list(_STYLE_LIST)
 
     def get_style_content(self, style_name: str) -> Optional[str]:
         """获取指定文风的内容"""
@@ -47,19 +49,25 @@ class PresetManager:
 
     def get_style_by_name(self, name: str) -> Optional[Dict[str, str]]:
         """根据名称查找文风"""
-        name_lower = name.lower()
-        for style_name in get_all_style_names():
-            if name_lower in style_name.lower():
-                return {
-                    "id": style_name,
-                    "name": style_name,
-                    "content_len": len(get_style(style_name))
-                }
+        style = _STYLE_INDEX.get(name)
+        if style:
+            return style
+
+        name_folded = name.casefold()
+        style = _STYLE_NAME_INDEX.get(name_folded)
+        if style:
+            return style
+
+        # 回退到子串匹配
+        for folded, style in _STYLE_NAME_INDEX.items():
+            if name_folded in folded:
+                return style
         return None
 
     def build_enhanced_prompt(self, base_prompt: str, style_name: Optional[str] = None,
                                include_nsfw: bool = True, include_summary: bool = True,
-                               include_tucao: bool = True, include_cot: bool = False) -> str:
+                               include_tucao: bool = True, include_cot: bool = False,
+                               resolve_style: bool = True) -> str:
         """
         构建增强的 prompt
 
@@ -70,12 +78,13 @@ class PresetManager:
             include_summary: 是否包含摘要格式
             include_tucao: 是否包含吐槽格式
             include_cot: 是否包含思维链
+            resolve_style: 未指定文风时是否查询当前激活的文风（调用方已查询过时传 False）
 
         Returns:
             增强后的完整 prompt
         """
         # 如果没有指定文风，检查数据库中是否有激活的文风
-        if not style_name:
+        if not style_name and resolve_style:
             current = self.get_current_style()
             if current:
                 style_name = current.get("name")
@@ -143,7 +152,7 @@ class PresetManager:
 
         # 优先使用 style_identifier，如果不在 STYLES 中则尝试 style_name
         style_name = active.get("style_identifier")
-        if not style_name or style_name not in STYLES:
+        if not style_name or style_name not in _STYLE_INDEX:
             # 尝试从 style_name 字段提取（可能是旧格式）
             raw_name = active.get("style_name", "")
             # 尝试匹配内置文风名称
@@ -152,10 +161,11 @@ class PresetManager:
                     style_name = builtin_name
                     break
 
-        if style_name and style_name in STYLES:
+        style = _STYLE_INDEX.get(style_name) if style_name else None
+        if style:
             return {
-                "id": style_name,
-                "name": style_name,
+                "id": style["id"],
+                "name": style["name"],
                 "activated_at": active.get("updated_at")
             }
         return None
@@ -332,8 +342,23 @@ class PresetManager:
             if current:
                 style_name = current.get("name")
 
+        # 文风已在此处解析（或被明确排除），未激活文风时无需再次查询数据库
         return self.build_enhanced_prompt(
             base_prompt,
-            style_name if include_style else None,
-            include_nsfw=include_guidelines
+            style_name,
+            include_nsfw=include_guidelines,
+            resolve_style=False
         )
+
+
+# ==================== 共享实例 ====================
+
+_shared_manager: Optional[PresetManager] = None
+
+
+def get_preset_manager() -> PresetManager:
+    """获取共享的 PresetManager 实例（绑定共享 SceneDB），避免每条命令重复构造"""
+    global _shared_manager
+    if _shared_manager is None:
+        _shared_manager = PresetManager(get_scene_db())
+    return _shared_manager
@@ -5,7 +5,7 @@
 import sqlite3
 from contextlib import contextmanager
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from pathlib import Path
 from src.common.logger import get_logger
 
@@ -26,13 +26,26 @@ CHARACTER_STATUS_FIELDS = frozenset({
 # 场景状态表允许更新的字段
 SCENE_STATE_FIELDS = frozenset({
     'enabled', 'location', 'clothing', 'scene_description', 'last_activity',
-    'last_update_time', 'init_time', 'user_id', 'updated_at', 'nai_enabled'
+    'last_update_time', 'last_update_ts', 'init_time', 'user_id', 'updated_at', 'nai_enabled'
 })
 
+# 最近历史查询：只取调用方用到的列（不读取较长的 bot_reply），按自增主键倒序走 chat_id 索引
+_RECENT_HISTORY_SQL = """
+    SELECT id, timestamp, location, clothing, scene_description, user_message
+    FROM scene_history
+    WHERE chat_id = ?
+    ORDER BY id DESC
+    LIMIT ?
+"""
+
 
 class SceneDB:
     """场景模式数据库管理类（优化版）"""
 
+    # 每日日程缓存：(db_path, user_id, weekday) -> 日程列表
+    # 类级别共享，任一实例写入日程时统一失效，避免多个实例间数据不一致
+    _day_schedule_cache: Dict[Tuple[str, str, int], List[Dict[str, Any]]] = {}
+
     def __init__(self, db_path: str = None):
         if db_path is None:
             plugin_dir = Path(__file__).parent.parent
@@ -72,6 +85,9 @@ class SceneDB:
         with self._get_connection() as conn:
             cursor = conn.cursor()
 
+            # WAL 模式：读写互不阻塞（设置会持久保存在数据库文件中）
+            cursor.execute("PRAGMA journal_mode=WAL")
+
             # 表1：日程表
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS schedules (
@@ -84,11 +100,21 @@ class SceneDB:
                     description TEXT,
                     location TEXT,
                     clothing TEXT,
+                    start_min INTEGER,
+                    end_min INTEGER,
                     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                     UNIQUE(user_id, weekday, time_start)
                 )
             """)
 
+            # 迁移旧日程表：补充分钟数列，查看日程时无需再解析 HH:MM
+            cursor.execute("PRAGMA table_info(schedules)")
+            schedule_columns = [row[1] for row in cursor.fetchall()]
+            if "start_min" not in schedule_columns:
+                cursor.execute("ALTER TABLE schedules ADD COLUMN start_min INTEGER")
+            if "end_min" not in schedule_columns:
+                cursor.execute("ALTER TABLE schedules ADD COLUMN end_min INTEGER")
+
             # 表2：场景状态表
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS scene_states (
@@ -100,6 +126,7 @@ class SceneDB:
                     scene_description TEXT,
                     last_activity TEXT,
                     last_update_time TIMESTAMP,
+                    last_update_ts INTEGER,
                     init_time TIMESTAMP,
                     user_id TEXT,
                     nai_enabled INTEGER DEFAULT 0,
@@ -118,6 +145,8 @@ class SceneDB:
                 cursor.execute("ALTER TABLE scene_states ADD COLUMN nai_enabled INTEGER DEFAULT 0")
             if "nsfw_enabled" not in columns:
                 cursor.execute("ALTER TABLE scene_states ADD COLUMN nsfw_enabled INTEGER DEFAULT 0")
+            if "last_update_ts" not in columns:
+                cursor.execute("ALTER TABLE scene_states ADD COLUMN last_update_ts INTEGER")
 
             # 表3：场景历史记录
             cursor.execute("""
@@ -227,23 +256,71 @@ class SceneDB:
 
     # ==================== 日程管理 ====================
 
+    def _invalidate_schedule_cache(self, user_id: str):
+        """清除指定用户的每日日程缓存"""
+        stale_keys = [
+            key for key in self._day_schedule_cache
+            if key[0] == self.db_path and key[1] == user_id
+        ]
+        for key in stale_keys:
+            self._day_schedule_cache.pop(key, None)
+
+    def _schedule_row(self, user_id: str, weekday: int, item: Dict[str, Any]) -> tuple:
+        """构造 schedules 表的一行，同时预先计算起止分钟数"""
+        time_start = item.get("time_start")
+        time_end = item.get("time_end")
+        return (
+            user_id,
+            weekday,
+            time_start,
+            time_end,
+            item.get("activity"),
+            item.get("description", ""),
+            item.get("location", ""),
+            item.get("clothing", ""),
+            self._time_to_minutes(time_start),
+            self._time_to_minutes(time_end)
+        )
+
     def save_schedule(self, user_id: str, weekday: int, schedule_item: Dict[str, Any]):
         """保存单条日程"""
+        self._invalidate_schedule_cache(user_id)
         with self._get_cursor() as cursor:
             cursor.execute("""
                 INSERT OR REPLACE INTO schedules
-                (user_id, weekday, time_start, time_end, activity, description, location, clothing)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            """, (
-                user_id,
-                weekday,
-                schedule_item.get("time_start"),
-                schedule_item.get("time_end"),
-                schedule_item.get("activity"),
-                schedule_item.get("description", ""),
-                schedule_item.get("location", ""),
-                schedule_item.get("clothing", "")
-            ))
+                (user_id, weekday, time_start, time_end, activity, description, location, clothing,
+                 start_min, end_min)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, self._schedule_row(user_id, weekday, schedule_item))
+
+    def save_schedules_bulk(self, user_id: str, weekday: int, items: List[Dict[str, Any]],
+                            metadata: Optional[Dict[str, str]] = None):
+        """
+        在单个事务内替换用户的全部日程，并写入元数据
+
+        Args:
+            user_id: 用户ID
+            weekday: 星期几（0-6）
+            items: 日程条目列表
+            metadata: 同时写入的元数据 {key: value}，scope 为 user_id
+        """
+        self._invalidate_schedule_cache(user_id)
+        rows = [self._schedule_row(user_id, weekday, item) for item in items]
+
+        with self._get_cursor() as cursor:
+            cursor.execute("DELETE FROM schedules WHERE user_id = ?", (user_id,))
+            cursor.executemany("""
+                INSERT OR REPLACE INTO schedules
+                (user_id, weekday, time_start, time_end, activity, description, location, clothing,
+                 start_min, end_min)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            if metadata:
+                now = datetime.now().isoformat()
+                cursor.executemany("""
+                    INSERT OR REPLACE INTO metadata (scope, key, value, updated_at)
+                    VALUES (?, ?, ?, ?)
+                """, [(user_id, key, value, now) for key, value in metadata.items()])
 
     def save_schedules_batch(self, user_id: str, schedules: Dict[str, List[Dict]]):
         """批量保存一周日程"""
@@ -265,6 +342,7 @@ class SceneDB:
 
     def clear_user_schedules(self, user_id: str):
         """清空用户的所有日程"""
+        self._invalidate_schedule_cache(user_id)
         with self._get_cursor() as cursor:
             cursor.execute("DELETE FROM schedules WHERE user_id = ?", (user_id,))
 
@@ -289,13 +367,13 @@ class SceneDB:
         }
 
         # 第一步：尝试从当前日期的日程中匹配
-        current_day_schedules = self.get_day_schedules(user_id, weekday)
+        current_day_schedules = self.get_cached_day_schedules(user_id, weekday)
         activity = self._match_activity_from_list(current_day_schedules, time_minutes, True)
         if activity:
             return activity
 
         # 第二步：尝试从前一天的跨午夜日程中匹配
-        previous_day_schedules = self.get_day_schedules(user_id, prev_weekday)
+        previous_day_schedules = self.get_cached_day_schedules(user_id, prev_weekday)
         activity = self._match_activity_from_list(previous_day_schedules, time_minutes, False)
 
         if activity:
@@ -323,6 +401,15 @@ class SceneDB:
 
         return None
 
+    def get_cached_day_schedules(self, user_id: str, weekday: int) -> List[Dict[str, Any]]:
+        """获取某天的日程（带缓存，日程写入时失效），返回的列表为共享对象，调用方不得修改"""
+        key = (self.db_path, user_id, weekday)
+        schedules = self._day_schedule_cache.get(key)
+        if schedules is None:
+            schedules = self.get_day_schedules(user_id, weekday)
+            self._day_schedule_cache[key] = schedules
+        return schedules
+
     @staticmethod
     def _time_to_minutes(time_str: str) -> Optional[int]:
         """将 'HH:MM' 转换为分钟数"""
@@ -376,7 +463,7 @@ class SceneDB:
             cursor.execute("""
                 SELECT * FROM schedules
                 WHERE user_id = ? AND weekday = ?
-                ORDER BY time_start
+                ORDER BY start_min, time_start
             """, (user_id, weekday))
             return [dict(row) for row in cursor.fetchall()]
 
@@ -436,6 +523,48 @@ class SceneDB:
             row = cursor.fetchone()
             return dict(row) if row else None
 
+    def find_best_state(self, session_id: str, stream_id: str, user_id: str,
+                        include_legacy: bool = False) -> Optional[Dict[str, Any]]:
+        """
+        单次查询找出用户最匹配的场景状态
+
+        优先级：会话ID精确匹配 > 同一 stream 下该用户最近的状态 > 旧版按 stream_id 存储的状态
+
+        Args:
+            session_id: 会话ID（stream_id:user_id）
+            stream_id: 聊天流ID
+            user_id: 用户ID
+            include_legacy: 是否匹配旧版以 stream_id 为 chat_id 的状态
+
+        Returns:
+            场景状态，未找到时返回 None
+        """
+        pattern = f"{stream_id}:%"
+        legacy_id = stream_id if include_legacy else None
+
+        with self._get_cursor() as cursor:
+            cursor.execute("""
+                SELECT *,
+                    CASE
+                        WHEN chat_id = ? THEN 0
+                        WHEN chat_id LIKE ? AND user_id = ? THEN 1
+                        ELSE 2
+                    END AS match_priority
+                FROM scene_states
+                WHERE chat_id = ?
+                   OR (chat_id LIKE ? AND user_id = ?)
+                   OR chat_id = ?
+                ORDER BY match_priority, updated_at DESC
+                LIMIT 1
+            """, (session_id, pattern, user_id, session_id, pattern, user_id, legacy_id))
+            row = cursor.fetchone()
+            if not row:
+                return None
+
+            state = dict(row)
+            state.pop("match_priority", None)
+            return state
+
     def is_scene_enabled(self, chat_id: str) -> bool:
         """检查场景模式是否启用"""
         state = self.get_scene_state(chat_id)
@@ -447,17 +576,18 @@ class SceneDB:
         existing_state = self.get_scene_state(chat_id)
         nai_enabled = existing_state.get("nai_enabled", 0) if existing_state else 0
 
-        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        current = datetime.now()
+        now = current.strftime("%Y-%m-%d %H:%M:%S")
 
         with self._get_cursor() as cursor:
             cursor.execute("""
                 INSERT OR REPLACE INTO scene_states
                 (chat_id, enabled, location, clothing, scene_description,
-                 last_activity, last_update_time, init_time, user_id, updated_at, nai_enabled)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                 last_activity, last_update_time, last_update_ts, init_time, user_id, updated_at, nai_enabled)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
             """, (
                 chat_id, 1, location, clothing, scene_description,
-                activity, now, now, user_id, now, nai_enabled
+                activity, now, int(current.timestamp()), now, user_id, now, nai_enabled
             ))
 
     def update_scene_state(self, chat_id: str, location: str = None, clothing: str = None,
@@ -480,9 +610,10 @@ class SceneDB:
                 params.append(value)
 
         if updates:
-            now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            updates.extend(["last_update_time = ?", "updated_at = ?"])
-            params.extend([now, now, chat_id])
+            current = datetime.now()
+            now = current.strftime("%Y-%m-%d %H:%M:%S")
+            updates.extend(["last_update_time = ?", "last_update_ts = ?", "updated_at = ?"])
+            params.extend([now, int(current.timestamp()), now, chat_id])
 
             with self._get_cursor() as cursor:
                 sql = f"UPDATE scene_states SET {', '.join(updates)} WHERE chat_id = ?"
@@ -510,6 +641,85 @@ class SceneDB:
             cursor.execute("DELETE FROM scene_history WHERE chat_id = ?", (chat_id,))
         logger.info(f"场景历史已清空: {chat_id}")
 
+    def reset_scene_atomic(self, chat_id: str, location: str, clothing: str,
+                           scene_description: str, activity: str, user_id: str,
+                           enabled: bool = False):
+        """
+        在单个事务内重置会话并写入新场景
+
+        清空场景状态、历史与角色状态后创建新场景（保留 NAI 开关），
+        并初始化角色状态，任一步失败整体回滚
+
+        Args:
+            chat_id: 会话ID
+            location: 地点
+            clothing: 着装
+            scene_description: 场景描述
+            activity: 当前活动
+            user_id: 用户ID
+            enabled: 是否直接启用场景
+        """
+        current = datetime.now()
+        now = current.strftime("%Y-%m-%d %H:%M:%S")
+
+        with self._get_cursor() as cursor:
+            cursor.execute("SELECT nai_enabled FROM scene_states WHERE chat_id = ?", (chat_id,))
+            row = cursor.fetchone()
+            nai_enabled = 1 if row and row["nai_enabled"] == 1 else 0
+
+            cursor.execute("DELETE FROM scene_states WHERE chat_id = ?", (chat_id,))
+            cursor.execute("DELETE FROM scene_history WHERE chat_id = ?", (chat_id,))
+            cursor.execute("DELETE FROM character_status WHERE chat_id = ?", (chat_id,))
+            cursor.execute("""
+                INSERT INTO scene_states
+                (chat_id, enabled, location, clothing, scene_description,
+                 last_activity, last_update_time, last_update_ts, init_time, user_id, updated_at, nai_enabled)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, (
+                chat_id, 1 if enabled else 0, location, clothing, scene_description,
+                activity, now, int(current.timestamp()), now, user_id, now, nai_enabled
+            ))
+            cursor.execute("INSERT INTO character_status (chat_id) VALUES (?)", (chat_id,))
+
+        logger.info(f"场景已重置并重新创建: {chat_id}")
+
+    def clear_sessions_atomic(self, chat_ids: List[str], nai_target: str):
+        """
+        在单个事务内清空多个会话的场景状态、历史与角色状态
+
+        任一会话开启了 NAI 时，将开关保留到 nai_target 上
+
+        Args:
+            chat_ids: 需要清空的会话ID列表
+            nai_target: 保留 NAI 开关的会话ID
+        """
+        if not chat_ids:
+            return
+
+        placeholders = ", ".join("?" * len(chat_ids))
+        params = tuple(chat_ids)
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+        with self._get_cursor() as cursor:
+            cursor.execute(
+                f"SELECT 1 FROM scene_states WHERE chat_id IN ({placeholders}) AND nai_enabled = 1 LIMIT 1",
+                params
+            )
+            preserve_nai = cursor.fetchone() is not None
+
+            cursor.execute(f"DELETE FROM scene_states WHERE chat_id IN ({placeholders})", params)
+            cursor.execute(f"DELETE FROM scene_history WHERE chat_id IN ({placeholders})", params)
+            cursor.execute(f"DELETE FROM character_status WHERE chat_id IN ({placeholders})", params)
+
+            if preserve_nai:
+                cursor.execute("""
+                    INSERT OR REPLACE INTO scene_states
+                    (chat_id, enabled, nai_enabled, created_at, updated_at)
+                    VALUES (?, 0, 1, ?, ?)
+                """, (nai_target, now, now))
+
+        logger.info(f"场景存档已清空: {', '.join(chat_ids)}")
+
     # ==================== 场景历史管理 ====================
 
     def add_scene_history(self, chat_id: str, location: str, clothing: str,
@@ -522,16 +732,18 @@ class SceneDB:
                 VALUES (?, ?, ?, ?, ?, ?)
             """, (chat_id, location, clothing, scene_description, user_message, bot_reply))
 
+    def get_latest_history_id(self, chat_id: str) -> Optional[int]:
+        """获取会话最新一条历史记录的ID（ID自增不复用，可作为历史版本号）"""
+        with self._get_cursor() as cursor:
+            cursor.execute("SELECT MAX(id) FROM scene_history WHERE chat_id = ?", (chat_id,))
+            row = cursor.fetchone()
+            return row[0] if row else None
+
     def get_recent_history(self, chat_id: str, limit: int = 5) -> List[Dict[str, Any]]:
         """获取最近的历史记录"""
         limit = max(1, min(limit, 100))  # 限制范围
         with self._get_cursor() as cursor:
-            cursor.execute("""
-                SELECT * FROM scene_history
-                WHERE chat_id = ?
-                ORDER BY timestamp DESC
-                LIMIT ?
-            """, (chat_id, limit))
+            cursor.execute(_RECENT_HISTORY_SQL, (chat_id, limit))
             return [dict(row) for row in reversed(cursor.fetchall())]
 
     # ==================== 预设管理 ====================
@@ -790,3 +1002,16 @@ class SceneDB:
         """获取当前叙事视角，默认第一人称"""
         value = self.get_schedule_metadata("global", "perspective")
         return value if value in ("第一人称", "第三人称") else "第一人称"
+
+
+# ==================== 共享实例 ====================
+
+_shared_db: Optional[SceneDB] = None
+
+
+def get_scene_db() -> SceneDB:
+    """获取共享的 SceneDB 实例（默认路径），避免每次命令都重新建表检查"""
+    global _shared_db
+    if _shared_db is None:
+        _shared_db = SceneDB()
+    return _shared_db
@@ -2,11 +2,10 @@
 状态管理模块
 负责角色状态的验证、更新、衰减和一致性检查
 """
-import json
 from datetime import datetime
 from typing import Dict, Any, Optional, Callable
 from src.common.logger import get_logger
-from .utils import parse_datetime
+from .utils import json_dumps, parse_datetime
 from .scene_db import SceneDB
 
 logger = get_logger("state_manager")
@@ -192,7 +191,7 @@ class StateManager:
             if field in status_updates:
                 value = status_updates[field]
                 if isinstance(value, list):
-                    validated_updates[field] = json.dumps(value, ensure_ascii=False)
+                    validated_updates[field] = json_dumps(value)
                 elif isinstance(value, str):
                     validated_updates[field] = value
 
@@ -202,7 +201,7 @@ class StateManager:
                 if isinstance(value, dict):
                     if field == "permanent_mods" and value:
                         logger.info(f"[StateManager] 永久性改造更新: {list(value.keys())}")
-                    validated_updates[field] = json.dumps(value, ensure_ascii=False)
+                    validated_updates[field] = json_dumps(value)
                 elif isinstance(value, str):
                     validated_updates[field] = value
 
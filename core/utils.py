@@ -5,35 +5,98 @@
 import json
 import re
 from datetime import datetime
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, List, Callable
 from src.common.logger import get_logger
 
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖，未安装时使用标准库
+    orjson = None
+
 logger = get_logger("scene_utils")
 
+# 连续的非空白字符（用于边压缩空白边截断）
+_NON_SPACE_RE = re.compile(r"\S+")
+
+# LLM 回复中 JSON 代码块的起止标记
+_JSON_FENCE_OPEN = "```json"
+_JSON_FENCE_CLOSE = "```"
+
+
+def json_loads(text: str) -> Any:
+    """解析JSON，已安装 orjson 时使用 orjson；失败时统一抛出 json.JSONDecodeError"""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+
+def json_dumps(value: Any) -> str:
+    """序列化为JSON文本（保留中文），已安装 orjson 时使用 orjson"""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS).decode()
+    return json.dumps(value, ensure_ascii=False)
+
+
+def json_dumps_bytes(value: Any) -> bytes:
+    """序列化为UTF-8编码的JSON字节（用作HTTP请求体），已安装 orjson 时直接得到 bytes"""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, ensure_ascii=False).encode("utf-8")
+
+
+def json_loads_str_list(text: str) -> Any:
+    """
+    解析字符串数组形式的JSON（如道具、精液来源）
 
-def safe_json_loads(text: str, default=None):
-    """安全解析JSON字符串"""
+    不含转义字符时字符串内部不可能出现引号，按引号切分即可得到各元素；
+    结构不符合或含转义时交给 json_loads
+    """
+    if "\\" not in text:
+        tokens = text.split('"')
+        if (
+            len(tokens) % 2 == 1 and len(tokens) >= 3
+            and tokens[0].strip() == "[" and tokens[-1].strip() == "]"
+            and all(sep.strip() == "," for sep in tokens[2:-1:2])
+        ):
+            return tokens[1::2]
+    return json_loads(text)
+
+
+def safe_json_loads(text: str, default=None, loads: Callable[[str], Any] = json_loads):
+    """安全解析JSON字符串，loads 可替换为针对字段结构的专用解析函数"""
     if not text:
         return default if default is not None else {}
+    # 状态字段大多是空字面量，直接返回新对象，无需调用解析器
+    if text == "{}":
+        return {}
+    if text == "[]":
+        return []
     try:
-        return json.loads(text)
+        return loads(text)
     except json.JSONDecodeError:
         return default if default is not None else {}
 
 
+def _extract_json_block(response: str) -> str:
+    """提取 ```json 代码块中的内容，没有完整代码块时原样返回"""
+    start = response.find(_JSON_FENCE_OPEN)
+    if start == -1:
+        return response
+    start += len(_JSON_FENCE_OPEN)
+    end = response.find(_JSON_FENCE_CLOSE, start)
+    if end == -1:
+        return response
+    return response[start:end].strip()
+
+
 def parse_json_response(response: str) -> Optional[dict]:
     """解析LLM返回的JSON，必要时尝试宽松解析"""
     try:
-        # 提取```json包裹的内容
-        json_match = re.search(r'```json\s*(.*?)\s*```', response, re.DOTALL)
-        if json_match:
-            json_str = json_match.group(1)
-        else:
-            # 尝试直接解析
-            json_str = response
+        # 提取```json包裹的内容，没有代码块时直接解析整段回复
+        json_str = _extract_json_block(response)
 
         # 解析JSON
-        data = json.loads(json_str)
+        data = json_loads(json_str)
         return data
 
     except json.JSONDecodeError as e:
@@ -94,6 +157,31 @@ def truncate_text(text: str, limit: int) -> str:
     return text[: max(0, limit - 1)].rstrip() + "…"
 
 
+def collapse_and_truncate(text: Optional[str], limit: int) -> str:
+    """
+    等价于 truncate_text(collapse_text(text), limit)，
+    但只扫描到足够截断的位置，长文本无需整体压缩
+    """
+    if not text:
+        return ""
+    parts = []
+    length = -1
+    for match in _NON_SPACE_RE.finditer(str(text)):
+        word = match.group()
+        parts.append(word)
+        length += len(word) + 1
+        if length > limit:
+            break
+    return truncate_text(" ".join(parts), limit)
+
+
+def unescape_newlines(text: str) -> str:
+    """将 LLM 输出中的字面量 \\n 还原为换行符，无转义时直接返回原字符串"""
+    if not text or "\\" not in text:
+        return text
+    return text.replace("\\n", "\n")
+
+
 def parse_datetime(time_str: str) -> Optional[datetime]:
     """解析时间字符串，支持多种格式"""
     if not time_str:
@@ -121,9 +209,9 @@ def parse_datetime(time_str: str) -> Optional[datetime]:
 def parse_status_json_fields(character_status: Dict[str, Any]) -> Dict[str, Any]:
     """解析角色状态中的JSON字段，返回解析后的字典"""
     return {
-        "inventory": safe_json_loads(character_status.get('inventory', '[]'), []),
-        "vaginal_foreign": safe_json_loads(character_status.get('vaginal_foreign', '[]'), []),
-        "semen_sources": safe_json_loads(character_status.get('semen_sources', '[]'), []),
+        "inventory": safe_json_loads(character_status.get('inventory', '[]'), [], json_loads_str_list),
+        "vaginal_foreign": safe_json_loads(character_status.get('vaginal_foreign', '[]'), [], json_loads_str_list),
+        "semen_sources": safe_json_loads(character_status.get('semen_sources', '[]'), [], json_loads_str_list),
         "permanent_mods": safe_json_loads(character_status.get('permanent_mods', ''), {}),
         "body_condition": safe_json_loads(character_status.get('body_condition', '{}'), {}),
         "fetishes": safe_json_loads(character_status.get('fetishes', '{}'), {})
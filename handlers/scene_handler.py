@@ -18,11 +18,11 @@ from src.config.config import global_config
 from src.common.logger import get_logger
 
 # 导入拆分后的模块
-from ..core.scene_db import SceneDB
-from ..core.preset_manager import PresetManager
+from ..core.scene_db import SceneDB, get_scene_db
+from ..core.preset_manager import PresetManager, get_preset_manager
 from ..core.llm_client import LLMClientFactory
 from ..core.nai_client import NaiClient
-from ..core.utils import build_session_id, collapse_text, truncate_text
+from ..core.utils import build_session_id, collapse_and_truncate, unescape_newlines
 from ..core.state_manager import (
     StateManager, SCENE_TYPE_NORMAL, SCENE_TYPE_ROMANTIC,
     SCENE_TYPE_INTIMATE, SCENE_TYPE_EXPLICIT, SCENE_TYPE_REST
@@ -95,13 +95,13 @@ class SceneFormatHandler(BaseEventHandler):
     def _ensure_initialized(self):
         """确保已初始化所有组件"""
         if self.db is None:
-            self.db = SceneDB()
+            self.db = get_scene_db()
         if self.planner_llm is None:
             self.planner_llm = LLMClientFactory.create_planner_client(self.get_config)
         if self.reply_llm is None:
             self.reply_llm = LLMClientFactory.create_reply_client(self.get_config)
         if self.preset_manager is None:
-            self.preset_manager = PresetManager(self.db)
+            self.preset_manager = get_preset_manager()
         if self.nai_client is None:
             self.nai_client = NaiClient(self.get_config)
 
@@ -121,6 +121,7 @@ class SceneFormatHandler(BaseEventHandler):
     async def cleanup(self):
         """清理资源（关闭 HTTP 客户端等）"""
         try:
+            # 共享的 HTTP session 由插件在停止时统一关闭，这里只释放本实例持有的客户端
             if self.planner_llm and hasattr(self.planner_llm, 'close'):
                 await self.planner_llm.close()
             if self.reply_llm and hasattr(self.reply_llm, 'close'):
@@ -279,7 +280,7 @@ class SceneFormatHandler(BaseEventHandler):
             final_status = self.db.get_character_status(session_id) or {}
 
             # 步骤4：格式化输出
-            scene_text = scene_reply['场景'].replace('\\n\\n', '\n\n').replace('\\n', '\n')
+            scene_text = unescape_newlines(scene_reply['场景'])
 
             # 给每段开头加两个空格缩进
             paragraphs = scene_text.split('\n\n')
@@ -401,13 +402,13 @@ class SceneFormatHandler(BaseEventHandler):
             clothing = scene_reply.get("着装", "")
             return f"换装为{clothing}" if clothing else "更换着装"
 
-        condensed_user = collapse_text(user_message)
+        condensed_user = collapse_and_truncate(user_message, 40)
         if condensed_user:
-            return truncate_text(condensed_user, 40)
+            return condensed_user
 
-        scene_excerpt = collapse_text(scene_reply.get("场景"))
+        scene_excerpt = collapse_and_truncate(scene_reply.get("场景"), 40)
         if scene_excerpt:
-            return truncate_text(scene_excerpt, 40)
+            return scene_excerpt
 
         return "场景更新"
 
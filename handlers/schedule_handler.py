@@ -10,7 +10,7 @@ from src.plugin_system.base.base_events_handler import BaseEventHandler
 from src.plugin_system.base.component_types import EventType, EventHandlerInfo, MaiMessages, ComponentType
 from src.common.logger import get_logger
 
-from ..core.scene_db import SceneDB
+from ..core.scene_db import get_scene_db
 from ..core.llm_client import LLMClientFactory
 from ..commands.schedule_command import generate_schedule, GLOBAL_SCHEDULE_USER
 
@@ -131,7 +131,7 @@ class DailyScheduleEventHandler(BaseEventHandler):
     def _ensure_initialized(self):
         """确保组件已初始化"""
         if self.db is None:
-            self.db = SceneDB()
+            self.db = get_scene_db()
         if self.llm is None:
             self.llm = LLMClientFactory.create_reply_client(self.get_config)
 
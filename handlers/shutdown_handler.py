@@ -0,0 +1,43 @@
+"""
+插件停止事件处理器 - 关闭插件共享的 HTTP session
+"""
+from typing import Tuple, Optional
+
+from src.plugin_system.base.base_events_handler import BaseEventHandler
+from src.plugin_system.base.component_types import EventType, EventHandlerInfo, MaiMessages, ComponentType
+from src.common.logger import get_logger
+
+from ..core._http import close_shared_session
+
+logger = get_logger("shutdown_handler")
+
+
+class SessionShutdownHandler(BaseEventHandler):
+    """插件停止时关闭 LLM 与 NAI 客户端共用的 HTTP session"""
+
+    event_type = EventType.ON_STOP
+    handler_name = "scene_session_shutdown_handler"
+    handler_description = "插件停止时关闭共享的 HTTP 连接池"
+    weight = 0
+    intercept_message = False
+
+    async def execute(
+        self, message: Optional[MaiMessages]
+    ) -> Tuple[bool, bool, Optional[str], Optional[any], Optional[MaiMessages]]:
+        """执行事件处理"""
+        try:
+            await close_shared_session()
+            logger.debug("共享 HTTP session 已关闭")
+        except Exception as e:
+            logger.warning(f"关闭共享 HTTP session 时出错: {e}")
+        return True, True, None, None, None
+
+    @classmethod
+    def get_handler_info(cls) -> EventHandlerInfo:
+        """返回处理器信息"""
+        return EventHandlerInfo(
+            name=cls.handler_name,
+            component_type=ComponentType.EVENT_HANDLER,
+            description=cls.handler_description,
+            event_type=cls.event_type
+        )
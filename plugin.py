@@ -19,6 +19,7 @@ from .commands.nai_command import NaiControlCommand
 from .commands.nsfw_command import NsfwControlCommand
 from .handlers.scene_handler import SceneFormatHandler
 from .handlers.schedule_handler import DailyScheduleEventHandler
+from .handlers.shutdown_handler import SessionShutdownHandler
 
 
 @register_plugin
@@ -181,6 +182,16 @@ class SceneFormatPlugin(BasePlugin):
                 default=1.0,
                 description="Planner模型重试间隔（秒）"
             ),
+            "planner.rate_limit": ConfigField(
+                type=float,
+                default=5.0,
+                description="Planner模型每秒请求数上限（0 表示不限速）"
+            ),
+            "planner.rate_burst": ConfigField(
+                type=int,
+                default=10,
+                description="Planner模型允许的突发请求数"
+            ),
             "planner.extra_params": ConfigField(
                 type=dict,
                 default={},
@@ -231,6 +242,16 @@ class SceneFormatPlugin(BasePlugin):
                 default=1.0,
                 description="Reply模型重试间隔（秒）"
             ),
+            "reply.rate_limit": ConfigField(
+                type=float,
+                default=5.0,
+                description="Reply模型每秒请求数上限（0 表示不限速）"
+            ),
+            "reply.rate_burst": ConfigField(
+                type=int,
+                default=10,
+                description="Reply模型允许的突发请求数"
+            ),
             "reply.extra_params": ConfigField(
                 type=dict,
                 default={},
@@ -332,6 +353,16 @@ class SceneFormatPlugin(BasePlugin):
                 type=float,
                 default=2.0,
                 description="NAI请求重试间隔（秒）"
+            ),
+            "rate_limit": ConfigField(
+                type=float,
+                default=1.0,
+                description="NAI每秒请求数上限（0 表示不限速）"
+            ),
+            "rate_burst": ConfigField(
+                type=int,
+                default=3,
+                description="NAI允许的突发请求数"
             )
         },
         "admin": {
@@ -375,5 +406,6 @@ class SceneFormatPlugin(BasePlugin):
         # 事件处理器
         components.append((SceneFormatHandler.get_handler_info(), SceneFormatHandler))
         components.append((DailyScheduleEventHandler.get_handler_info(), DailyScheduleEventHandler))
+        components.append((SessionShutdownHandler.get_handler_info(), SessionShutdownHandler))
 
         return components